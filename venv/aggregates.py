@@ -0,0 +1,337 @@
+import heapq
+import threading
+from collections import Counter, namedtuple
+from itertools import chain, product
+from operator import itemgetter
+
+from rdflib import Literal, RDF, Variable
+from rdflib.query import ResultRow
+from rdflib.term import Identifier
+
+from graph_cache import objects_by_subject
+from queries import ONTO
+from triple_store import TermIds, decode_terms, pack_state, unpack_state
+
+# Dimensions a crash can be counted by, and where each one hangs off the
+# (drone, crash event) pair.
+DRONE_DIMENSIONS = {"model": ONTO.model, "operator": ONTO.operator}
+EVENT_DIMENSIONS = {"weather": ONTO.weather, "location": ONTO.location, "phase": ONTO.phase}
+DIMENSIONS = dict(DRONE_DIMENSIONS, **EVENT_DIMENSIONS)
+# Built once, since ONTO.<name> makes a new URIRef on every access
+DRONE, CRASH_EVENT, INVOLVED_IN_CRASH = ONTO.Drone, ONTO.CrashEvent, ONTO.involvedInCrash
+
+# What one fact of a view is, as the pattern the view's queries match:
+#   "crash"        ?drone rdf:type onto:Drone . ?drone onto:involvedInCrash ?crashEvent
+#   "involvement"  ?drone onto:involvedInCrash ?crashEvent
+#   "event"        ?crashEvent rdf:type onto:CrashEvent
+#   "subject"      any ?crashEvent that has the view's dimensions
+# The last two only have the crash event's own dimensions.
+FACTS = ("crash", "involvement", "event", "subject")
+
+
+class View(namedtuple("View", ["group_by", "where", "require", "facts"])):
+    """A materialized ``GROUP BY group_by`` count, sliced by the ``where`` dimensions.
+
+    A fact only counts towards a view when it has a value for every
+    dimension the view mentions, ``require`` included, the same way a
+    SPARQL basic graph pattern drops solutions with a missing triple.
+    """
+
+    def __new__(cls, group_by=(), where=(), require=(), facts="crash"):
+        view = super().__new__(cls, tuple(group_by), tuple(where), tuple(require), facts)
+        if facts not in FACTS:
+            raise ValueError(f"Unknown facts {facts!r}; expected one of {', '.join(FACTS)}")
+        if facts in ("event", "subject") and not set(view.dimensions) <= set(EVENT_DIMENSIONS):
+            raise ValueError(f"Views over {facts!r} facts can only use {', '.join(EVENT_DIMENSIONS)}")
+        return view
+
+    @property
+    def dimensions(self):
+        return self.group_by + self.where + self.require
+
+
+class CountIndex:
+    """Crash counts for a fixed set of views, kept in step with the graph.
+
+    Each view counts the facts named by its ``facts`` (see ``FACTS``) and
+    keeps one Counter per ``where`` slice, so a filtered group-by is a dict
+    lookup and a top-k is served from a cached ``heapq.nlargest`` until
+    that slice changes.
+
+    ``build`` counts a whole graph into fresh counters and swaps them in,
+    so readers keep getting the previous counts while it runs. ``apply``
+    takes the triples that turned one graph into the next and recounts
+    only the drones, crash events and links between them that those
+    triples touch: what they contributed is worked out again on the old
+    graph and taken off, then counted on the new one.
+    """
+
+    def __init__(self, views):
+        self.views = dict(views)
+        self.revision = None
+        self._lock = threading.Lock()
+        self._slices = {name: {} for name in self.views}
+        self._top = {}
+        self._crash_views = [(name, view) for name, view in self.views.items() if view.facts in ("crash", "involvement")]
+        self._event_views = [(name, view) for name, view in self.views.items() if view.facts in ("event", "subject")]
+
+    def build(self, graph, revision=None):
+        found = objects_by_subject(graph, [RDF.type, INVOLVED_IN_CRASH, *DIMENSIONS.values()])
+        objects = lambda subject, predicate: found[predicate].get(subject, ())
+        subjects = set(found[RDF.type]).union(
+            found[INVOLVED_IN_CRASH], *(found[predicate] for predicate in EVENT_DIMENSIONS.values())
+        )
+        slices = {name: {} for name in self.views}
+        for subject in subjects:
+            _tally(slices, {}, self._crash_facts(subject, objects), 1)
+            _tally(slices, {}, self._event_facts(subject, objects), 1)
+        with self._lock:
+            self._slices = slices
+            self._top = {}
+            self.revision = revision
+
+    def apply(self, old, new, added=(), removed=(), revision=None):
+        """Update the counts of graph ``old`` to graph ``new``, which differ by ``added`` and ``removed``."""
+        # Drones whose own triples changed are recounted with all their crashes;
+        # a new or changed crash only through the links to it, so a drone with
+        # thousands of crashes costs one link when it gets another
+        drones, events, links = set(), set(), {}
+        changed_events = set()
+        for s, p, o in chain(added, removed):
+            if p == RDF.type:
+                drones.add(s)
+                events.add(s)
+            elif p in DRONE_DIMENSIONS.values():
+                drones.add(s)
+            elif p == INVOLVED_IN_CRASH:
+                links.setdefault(s, set()).add(o)
+            elif p in EVENT_DIMENSIONS.values():
+                changed_events.add(s)
+        events |= changed_events
+        for event in changed_events:
+            for graph in (old, new):
+                for drone in graph.subjects(INVOLVED_IN_CRASH, event):
+                    links.setdefault(drone, set()).add(event)
+        taken = self._changed_facts(old, drones, events, links)
+        counted = self._changed_facts(new, drones, events, links)
+        with self._lock:
+            _tally(self._slices, self._top, taken, -1)
+            _tally(self._slices, self._top, counted, 1)
+            self.revision = revision
+
+    def on_swap(self, old, new, added, removed):
+        """``GraphCache`` subscriber: follow the dataset from snapshot to snapshot."""
+        if self.revision == new.revision:
+            return
+        if old is None or self.revision != old.revision:
+            self.build(new.graph, new.revision)
+            return
+        if len(added) + len(removed) > len(new.graph) // 2:
+            self.build(new.graph, new.revision)
+        else:
+            self.apply(old.graph, new.graph, added, removed, new.revision)
+
+    def dump(self):
+        """Return the counts as bytes for ``restore``."""
+        ids = TermIds()
+        slices = {}
+        with self._lock:
+            for name, view_slices in self._slices.items():
+                slices[name] = [
+                    [_ids(ids, where), [[_ids(ids, group), count] for group, count in counter.items()]]
+                    for where, counter in view_slices.items()
+                ]
+        views = {name: list(view) for name, view in self.views.items()}
+        return pack_state({"views": views, "terms": ids.rows, "slices": slices})
+
+    def restore(self, data, revision):
+        """Load counts ``dump`` made at ``revision``; False if they were made for other views."""
+        state = unpack_state(data)
+        if state is None:
+            return False
+        header = state[0]
+        views = {name: View(*view) for name, view in header.get("views", {}).items()}
+        if views != self.views:
+            return False
+        terms = decode_terms(header["terms"])
+        slices = {}
+        for name, view_slices in header["slices"].items():
+            slices[name] = {}
+            for where, counts in view_slices:
+                counter = Counter({tuple(terms[id] for id in group): count for group, count in counts})
+                slices[name][tuple(terms[id] for id in where)] = counter
+        with self._lock:
+            self._slices = slices
+            self._top = {}
+            self.revision = revision
+        return True
+
+    def counts(self, name, **where):
+        """Return ``{group values: count}`` for view ``name`` restricted to ``where``."""
+        with self._lock:
+            return dict(self._slice(name, where))
+
+    def total(self, name, **where):
+        with self._lock:
+            return sum(self._slice(name, where).values())
+
+    def top(self, name, k=1, **where):
+        """Return the ``k`` largest ``(group values, count)`` pairs, largest first."""
+        key = (name, self._where_key(name, where))
+        with self._lock:
+            cached = self._top.get(key)
+            if cached is None or cached[0] < k:
+                counter = self._slices[name].get(key[1])
+                if not counter:
+                    # Nothing is cached for a slice the data does not have, so
+                    # requests for made-up values cannot grow the cache
+                    return []
+                cached = (k, heapq.nlargest(k, counter.items(), key=itemgetter(1)))
+                self._top[key] = cached
+            return cached[1][:k]
+
+    def select(self, name, limit=None, **where):
+        """Return view ``name`` as the rows of the query it materializes.
+
+        Rows bind the view's ``group_by`` dimensions and ``?crashCount``,
+        the names ``check_consistency`` expects of that query. With
+        ``limit`` only the largest groups are returned, as for an
+        ``ORDER BY DESC(?crashCount) LIMIT`` query.
+        """
+        view = self.views[name]
+        if not view.group_by:
+            pairs = [((), self.total(name, **where))]
+        elif limit is None:
+            pairs = list(self.counts(name, **where).items())
+        else:
+            pairs = self.top(name, limit, **where)
+        return CountResult(view.group_by, pairs)
+
+    def _where_key(self, name, where):
+        return tuple(_term(where[dim]) for dim in self.views[name].where)
+
+    def _slice(self, name, where):
+        return self._slices[name].get(self._where_key(name, where), Counter())
+
+    def _changed_facts(self, graph, drones, events, links):
+        facts = []
+        for drone in drones:
+            facts += self._crash_facts(drone, graph.objects)
+        for drone, linked in links.items():
+            if drone not in drones:
+                linked = [event for event in linked if (drone, INVOLVED_IN_CRASH, event) in graph]
+                facts += self._crash_facts(drone, graph.objects, linked)
+        for event in events:
+            facts += self._event_facts(event, graph.objects)
+        return facts
+
+    def _crash_facts(self, drone, objects, events=None):
+        # Every (view, where values, group values) that ``drone`` is counted
+        # under through its crash ``events``, all of them by default;
+        # objects(subject, predicate) yields the graph's matching objects
+        if events is None:
+            events = list(objects(drone, INVOLVED_IN_CRASH))
+        if not events or not self._crash_views:
+            return []
+        typed = DRONE in set(objects(drone, RDF.type))
+        drone_values = {dim: list(objects(drone, predicate)) for dim, predicate in DRONE_DIMENSIONS.items()}
+        facts = []
+        for event in events:
+            values = dict(drone_values, **{
+                dim: list(objects(event, predicate)) for dim, predicate in EVENT_DIMENSIONS.items()
+            })
+            for name, view in self._crash_views:
+                if view.facts == "crash" and not typed:
+                    continue
+                facts.extend(_combinations(name, view, values))
+        return facts
+
+    def _event_facts(self, event, objects):
+        # The same for ``event`` as a crash event in its own right
+        if not self._event_views:
+            return []
+        types = set(objects(event, RDF.type))
+        values = {dim: list(objects(event, predicate)) for dim, predicate in EVENT_DIMENSIONS.items()}
+        facts = []
+        for name, view in self._event_views:
+            if view.facts == "event" and CRASH_EVENT not in types:
+                continue
+            facts.extend(_combinations(name, view, values))
+        return facts
+
+
+class CountResult:
+    """``(group values, count)`` pairs iterated as rdflib SELECT result rows."""
+
+    def __init__(self, group_by, pairs):
+        self.vars = [Variable(dim) for dim in group_by] + [Variable("crashCount")]
+        self._pairs = pairs
+
+    def __iter__(self):
+        for group, count in self._pairs:
+            yield ResultRow(dict(zip(self.vars, group + (Literal(count),))), self.vars)
+
+
+def _ids(ids, terms):
+    return [ids[term] for term in terms]
+
+
+def _combinations(name, view, values):
+    for combination in product(*(values[dim] for dim in view.dimensions)):
+        group_key = combination[:len(view.group_by)]
+        where_key = combination[len(view.group_by):len(view.group_by) + len(view.where)]
+        yield name, where_key, group_key
+
+
+def _tally(slices, top, facts, sign):
+    for name, where_key, group_key in facts:
+        counter = slices[name].get(where_key)
+        if counter is None:
+            counter = slices[name][where_key] = Counter()
+        counter[group_key] += sign
+        if counter[group_key] <= 0:
+            del counter[group_key]
+        top.pop((name, where_key), None)
+
+
+def _term(value):
+    return value if isinstance(value, Identifier) else Literal(value)
+
+
+def check_consistency(index, graph, registry, name, query_name, limited=False, **where):
+    """Compare view ``name`` with the answer of registered query ``query_name``.
+
+    The query's grouping variables must be named after the view's
+    dimensions and its count must be bound to ``?crashCount``. For
+    ``ORDER BY ... LIMIT`` queries pass ``limited=True``; their rows are
+    then checked against the index's counts and its top count instead of
+    requiring the full group set. Returns a list of mismatch descriptions,
+    empty when the index agrees.
+    """
+    view = index.views[name]
+    expected = index.counts(name, **where)
+    actual = {}
+    for row in registry.query(query_name, graph, **where):
+        group_key = tuple(row[dim] for dim in view.group_by)
+        actual[group_key] = int(row["crashCount"])
+
+    mismatches = []
+    if not view.group_by:
+        actual_total = sum(actual.values())
+        if actual_total != index.total(name, **where):
+            mismatches.append(f"{name}{where}: total {index.total(name, **where)} != {actual_total}")
+        return mismatches
+
+    for group_key, count in actual.items():
+        if expected.get(group_key, 0) != count:
+            mismatches.append(f"{name}{where} {group_key}: {expected.get(group_key, 0)} != {count}")
+    if limited:
+        top = index.top(name, 1, **where)
+        if actual and top and top[0][1] != max(actual.values()):
+            mismatches.append(f"{name}{where}: top count {top[0][1]} != {max(actual.values())}")
+        elif bool(actual) != bool(top):
+            mismatches.append(f"{name}{where}: top {top} != {actual}")
+    elif set(actual) != set(expected):
+        missing = set(expected) ^ set(actual)
+        mismatches.append(f"{name}{where}: groups differ on {sorted(missing)}")
+    return mismatches
@@ -0,0 +1,588 @@
+import os
+
+from flask import Flask, abort, jsonify, request
+from rdflib import URIRef
+
+from graph_cache import GraphCache, StoreCache
+from aggregates import CountIndex, View, check_consistency
+from backends import create_backend
+from columnar import CrashTable
+from instrumentation import Metrics, instrument, stage
+from queries import QueryRegistry
+from result_cache import ResultCache
+from rules import RuleEngine, parse_rule
+from streaming import result_rows, stream_response
+
+FUSEKI_URL = os.environ.get("CRASH_FUSEKI_URL", "http://localhost:3030/droneCrashWeather")
+DATA_URL = FUSEKI_URL + "/data"
+QUERY_URL = FUSEKI_URL + "/query"
+# Triple store written by ingest.py; when set, the app serves from it instead of Fuseki's data
+STORE_PATH = os.environ.get("CRASH_STORE")
+
+app = Flask(__name__)
+
+# Per-stage request timings, sent as Server-Timing headers and summed up at /metrics
+metrics = Metrics()
+instrument(app, metrics)
+
+# One copy of the dataset shared by every route, revalidated in the background
+graph_cache = StoreCache(STORE_PATH) if STORE_PATH else GraphCache(DATA_URL, QUERY_URL)
+
+# Every route's SPARQL is parsed once here; parameters go in as initBindings
+queries = QueryRegistry()
+
+# Queries the local backend answers from state derived from the cached graph
+# instead of evaluating them with rdflib; filled in next to the routes below
+local_queries = {}
+
+# Where queries run: "local" evaluates them on the cached graph, "remote"
+# sends them to Fuseki's SPARQL endpoint, "auto" picks per query
+backend = create_backend(
+    os.environ.get("CRASH_QUERY_BACKEND", "local"), queries, graph_cache, QUERY_URL, local_queries
+)
+
+# Materialized crash counts behind the GROUP BY/COUNT routes, kept in step
+# with the graph cache. Each view counts the facts its route's query matches:
+# typed drones' crashes unless it says otherwise.
+crash_counts = CountIndex({
+    "byWeather": View(group_by=["weather"], require=["location"]),
+    "crashesByWeather": View(where=["weather"]),
+    "byModel": View(group_by=["model"]),
+    "modelByWeather": View(group_by=["model"], where=["weather"]),
+    "byModelAndOperator": View(group_by=["model", "operator"]),
+    "eventsByPhase": View(group_by=["phase"], facts="event"),
+    "byLocation": View(group_by=["location"], facts="involvement"),
+    "subjectsByLocation": View(group_by=["location"], facts="subject"),
+    "operatorAndModelByPhase": View(group_by=["operator", "model"], where=["phase"]),
+    "operatorAndModelByWeather": View(group_by=["operator", "model"], where=["weather"]),
+    "operatorByWeather": View(group_by=["operator"], where=["weather"]),
+    "modelAndOperatorByLocation": View(group_by=["model", "operator"], where=["location"]),
+    "locationByModel": View(group_by=["location"], where=["model"]),
+})
+graph_cache.subscribe(crash_counts.on_swap)
+
+def count_index():
+    # Touching the snapshot loads the dataset, and builds the index, on first use
+    graph_cache.snapshot
+    return crash_counts
+
+# The count routes run the query a view materializes on the backend, which
+# answers it from the index when it runs locally (see COUNT_INDEX_CHECKS)
+def query_counts(view, query_name, **where):
+    return sparql_counts(backend.select(query_name, **where), crash_counts.views[view].group_by)
+
+def total_count(query_name, **where):
+    return sum(count for _, count in sparql_counts(backend.select(query_name, **where), ()))
+
+def sparql_counts(results, group_by):
+    # A GROUP BY over no solutions can come back as one row with nothing bound
+    with stage("rows"):
+        return [
+            (tuple(row[dim] for dim in group_by), int(row["crashCount"]))
+            for row in results if row["crashCount"] is not None
+        ]
+
+# Risk rules, materialized into an overlay graph whenever the dataset changes
+risk_rules = RuleEngine([
+    parse_rule('Drone(?d) ^ CrashEvent(?e) ^ involvedInCrash(?d, ?e) ^ weather(?e, "Heavy Rain/Snow") -> hasRisk(?d, "High")'),
+])
+graph_cache.subscribe(risk_rules.on_swap)
+
+# Columnar copy of the crash rows behind the row-listing routes
+crash_table = CrashTable()
+graph_cache.subscribe(crash_table.on_swap)
+
+# With the on-disk store the derived state above is saved next to the triples,
+# so a restart resumes from it instead of rebuilding it from a full scan
+if STORE_PATH:
+    graph_cache.persist("crashCounts", crash_counts)
+    graph_cache.persist("riskRules", risk_rules)
+    graph_cache.persist("crashTable", crash_table)
+
+def table():
+    graph_cache.snapshot
+    return crash_table
+
+def table_query(columns, require=(), optional=()):
+    # Answers a query from the crash table, whose rows are already in drone order
+    def select(after=None, **where):
+        return table().select(columns, after=after, require=require, optional=optional, **where)
+    return select
+
+def inferred_graph():
+    graph_cache.snapshot
+    return risk_rules.inferred
+
+# Finished JSON responses of the aggregate routes, per dataset revision. With the
+# remote backend there is no local revision to key on, so nothing is cached.
+response_cache = ResultCache(lambda: graph_cache.revision if backend.local else None)
+graph_cache.subscribe(response_cache.on_swap)
+
+def spo_rows(results):
+    data = []
+    with stage("rows"):
+        for row in results:
+            data.append({
+                "subject": row[0] if len(row) > 0 else None,
+                "property": row[1] if len(row) > 1 else None,
+                "object": row[2] if len(row) > 2 else None
+            })
+    return data
+
+def count_rows(pairs):
+    with stage("rows"):
+        return [tuple(str(value) for value in group) + (str(count),) for group, count in pairs]
+
+def count_dicts(pairs, names):
+    with stage("rows"):
+        return [
+            dict(zip(names, (str(value) for value in group)), crashCount=str(count))
+            for group, count in pairs
+        ]
+
+queries.register("dronesWithHighRisk", """
+    SELECT ?d WHERE { ?d onto:hasRisk "High" }
+""")
+
+@app.route('/test')
+@response_cache.cached()
+def test():
+    # Query the inferred triples
+    qe = queries.query("dronesWithHighRisk", inferred_graph())
+
+    # Process the results
+    drones_with_high_risk = [str(result["d"]) for result in qe]
+
+    return jsonify({'drones_with_high_risk': drones_with_high_risk})
+
+queries.register("modelWithMostCrashesByWeather", """
+    SELECT ?model (COUNT(?model) AS ?crashCount) WHERE
+    {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:weather ?weather .
+      ?drone onto:model ?model .
+    }
+    GROUP BY ?model
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/query')
+@response_cache.cached()
+def query_drone_crash_weather():
+    top = query_counts("modelByWeather", "modelWithMostCrashesByWeather", weather="Fog")
+    return jsonify(spo_rows(count_rows(top)))
+
+queries.register("modelAndLocation", """
+    SELECT ?model ?location WHERE
+    {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?drone onto:model ?model .
+      ?crashEvent onto:location ?location .
+    }
+""")
+local_queries["modelAndLocation"] = table_query(["model", "location"], require=["crash", "model", "location"])
+
+@app.route('/modelAndLocation')
+@response_cache.cached()
+def getModelAndLocation():
+    return jsonify(spo_rows(backend.select("modelAndLocation")))
+
+queries.register("countByAllWeatherConditions", """
+    SELECT ?weather (COUNT(?crashEvent) AS ?crashCount) WHERE
+    {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:location ?location .
+      ?crashEvent onto:weather ?weather .
+    }
+    GROUP BY ?weather
+""")
+
+@app.route('/countByAllWeatherConditions')
+@response_cache.cached()
+def countByAllWeatherConditions():
+    counts = query_counts("byWeather", "countByAllWeatherConditions")
+    return jsonify(spo_rows(count_rows(counts)))
+
+@app.route('/countModelBySpecificWeatherCondition/<string:weather_condition>')
+@response_cache.cached(weather_condition=str.capitalize)
+def getModelBySpecificWeatherCondition(weather_condition):
+    weather_condition = weather_condition.capitalize()
+    top = query_counts("modelByWeather", "modelWithMostCrashesByWeather", weather=weather_condition)
+    return jsonify(spo_rows(count_rows(top)))
+
+queries.register("countCrashedEventsByWeather", """
+    SELECT (COUNT(?crashEvent) AS ?crashCount) WHERE
+    {
+        ?drone rdf:type onto:Drone .
+        ?drone onto:involvedInCrash ?crashEvent .
+        ?crashEvent onto:weather ?weather .
+    }
+""")
+
+@app.route('/countCrashedEventsBySpecificWeatherCondition/<string:weather_condition>')
+@response_cache.cached(weather_condition=str.capitalize)
+def countEventsBySpecificWeatherCondition(weather_condition):
+    weather_condition = weather_condition.capitalize()
+    total = total_count("countCrashedEventsByWeather", weather=weather_condition)
+    return jsonify(spo_rows([(str(total),)]))
+
+queries.register("whichModelHasMostCrashes", """
+    SELECT ?model (COUNT(?crashEvent) AS ?crashCount) WHERE
+    {
+        ?drone rdf:type onto:Drone .
+        ?drone onto:involvedInCrash ?crashEvent .
+        ?drone onto:model ?model .
+    }
+    GROUP BY ?model
+    ORDER BY DESC(COUNT(?crashEvent))
+    LIMIT 1
+""")
+
+@app.route('/whichModelHasMostCrashes')
+@response_cache.cached()
+def whichModelHasMostCrashes():
+    top = query_counts("byModel", "whichModelHasMostCrashes")
+    return jsonify(spo_rows(count_rows(top)))
+
+queries.register("countModelAndOperatorInvolvedInCrash", """
+    SELECT ?model ?operator (COUNT(*) AS ?crashCount) WHERE
+    {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?drone onto:model ?model .
+      ?drone onto:operator ?operator .
+    }
+    GROUP BY ?model ?operator
+    ORDER BY ?model
+""")
+
+@app.route('/countModelAndOperatorInvolvedInCrash')
+@response_cache.cached()
+def countModelAndOperatorInvolvedInCrash():
+    counts = query_counts("byModelAndOperator", "countModelAndOperatorInvolvedInCrash")
+    rows = count_rows(counts)
+    rows.sort(key=lambda row: row[:2])
+    return jsonify(spo_rows(rows))
+
+queries.register("countAllCrashedByPhase", """
+    SELECT ?phase (COUNT(?crashEvent) AS ?crashCount) WHERE
+    {
+      ?crashEvent rdf:type onto:CrashEvent .
+      ?crashEvent onto:phase ?phase .
+    }
+    GROUP BY ?phase
+""")
+
+@app.route('/countAllCrashedByPhase')
+@response_cache.cached()
+def countAllCrashedByPhase():
+    counts = query_counts("eventsByPhase", "countAllCrashedByPhase")
+    return jsonify(spo_rows(count_rows(counts)))
+
+queries.register("phaseWithMostCrashedEvents", """
+    SELECT ?phase (COUNT(?crashEvent) AS ?crashCount) WHERE
+    {
+      ?crashEvent rdf:type onto:CrashEvent .
+      ?crashEvent onto:phase ?phase .
+    }
+    GROUP BY ?phase
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/phaseWithMostCrashedEvents')
+@response_cache.cached()
+def phaseWithMostCrashedEvents():
+    top = query_counts("eventsByPhase", "phaseWithMostCrashedEvents")
+    return jsonify(spo_rows(count_rows(top)))
+
+# The row-listing routes stream their rows and page through them by drone:
+# ?limit=<rows>&after=<drone IRI> continues after the last drone of the
+# previous page, following the routes' ORDER BY ?drone
+DATA_SELECT = "SELECT ?drone ?model ?operator ?date ?location ?phase ?weather"
+AFTER_CURSOR = "FILTER(STR(?drone) > STR(?after))"
+
+DATA_COLUMNS = ["drone", "model", "operator", "date", "location", "phase", "weather"]
+CRASH_DETAILS = ["model", "operator", "date", "location", "phase", "weather"]
+
+def register_paged(name, where, require, optional=()):
+    # require and optional describe the pattern to the crash table, which
+    # answers both queries locally
+    queries.register(name, DATA_SELECT + " WHERE {" + where + "} ORDER BY ?drone")
+    queries.register(name + "After", DATA_SELECT + " WHERE {" + where + AFTER_CURSOR + "} ORDER BY ?drone")
+    local_queries[name] = local_queries[name + "After"] = table_query(DATA_COLUMNS, require, optional)
+
+# Characters that cannot appear in an IRI, so in a cursor taken from a row's ?drone
+IRI_EXCLUDED = frozenset('<>" {}|\\^`')
+
+def paged_rows(name, **bindings):
+    after = request.args.get('after')
+    limit = request.args.get('limit')
+    if after and IRI_EXCLUDED.intersection(after):
+        abort(400, description="after must be the drone IRI of a row from the previous page")
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            abort(400, description="limit must be a positive integer")
+        limit = int(limit)
+    if after:
+        results = backend.select(name + "After", after=URIRef(after), **bindings)
+    else:
+        results = backend.select(name, **bindings)
+    return stream_response(result_rows(results, limit))
+
+register_paged("getAllData", """
+    ?drone rdf:type onto:Drone .
+    ?drone onto:model ?model .
+    ?drone onto:operator ?operator .
+    OPTIONAL {
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:date ?date .
+      ?crashEvent onto:location ?location .
+      ?crashEvent onto:phase ?phase .
+      ?crashEvent onto:weather ?weather .
+    }
+""", require=["model", "operator"], optional=["crash", "date", "location", "phase", "weather"])
+
+@app.route('/getAllData')
+def getAllData():
+    return paged_rows("getAllData")
+
+# Shared by the filterData* routes; each one binds one of ?phase, ?date or ?weather
+register_paged("filterData", """
+    ?drone rdf:type onto:Drone .
+    ?drone onto:model ?model .
+    ?drone onto:operator ?operator .
+    ?drone onto:involvedInCrash ?crashEvent .
+    ?crashEvent onto:date ?date .
+    ?crashEvent onto:location ?location .
+    ?crashEvent onto:phase ?phase .
+    ?crashEvent onto:weather ?weather .
+""", require=["crash", *CRASH_DETAILS])
+
+@app.route('/filterDataByPhase/<string:phase>')
+def filterDataByPhase(phase):
+    phase = phase.capitalize()
+    return paged_rows("filterData", phase=phase)
+
+@app.route('/filterDataByDate')
+def filterDataByDate():
+    date = request.args.get('date', '')
+    return paged_rows("filterData", date=date)
+
+@app.route('/filterAllDataWithWeatherCondition/<string:weather_condition>')
+def filterAllDataWithWeatherCondition(weather_condition):
+    weather_condition = weather_condition.capitalize()
+    return paged_rows("filterData", weather=weather_condition)
+
+queries.register("getModelAndOperatorByPhase", """
+    SELECT ?operator ?model (COUNT(?crashEvent) AS ?crashCount)
+    WHERE {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:model ?model .
+      ?drone onto:operator ?operator .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:phase ?phase .
+    }
+    GROUP BY ?operator ?model
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/getModelAndOperatorByPhase/<string:phase>')
+@response_cache.cached(phase=str.capitalize)
+def getModelAndOperatorByPhase(phase):
+    phase = phase.capitalize()
+    top = query_counts("operatorAndModelByPhase", "getModelAndOperatorByPhase", phase=phase)
+    return jsonify(count_dicts(top, ["operator", "model"]))
+
+queries.register("getModelAndOperatorByWeather", """
+    SELECT ?operator ?model (COUNT(?crashEvent) AS ?crashCount)
+    WHERE {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:model ?model .
+      ?drone onto:operator ?operator .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:weather ?weather .
+    }
+    GROUP BY ?operator ?model
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/getModelAndOperatorByWeather/<string:weather_condition>')
+@response_cache.cached(weather_condition=str.capitalize)
+def getModelAndOperatorByWeather(weather_condition):
+    weather_condition = weather_condition.capitalize()
+    top = query_counts("operatorAndModelByWeather", "getModelAndOperatorByWeather", weather=weather_condition)
+    return jsonify(count_dicts(top, ["operator", "model"]))
+
+queries.register("getOperatorWithMostCrashedByWeather", """
+    SELECT ?operator (COUNT(?crashEvent) AS ?crashCount)
+    WHERE {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:operator ?operator .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:weather ?weather .
+    }
+    GROUP BY ?operator
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/getOperatorWithMostCrashedByWeather/<string:weather_condition>')
+@response_cache.cached(weather_condition=str.capitalize)
+def getOperatorWithMostCrashedByWeather(weather_condition):
+    weather_condition = weather_condition.capitalize()
+    top = query_counts("operatorByWeather", "getOperatorWithMostCrashedByWeather", weather=weather_condition)
+    return jsonify(count_dicts(top, ["operator"]))
+
+queries.register("getLocationWithCrashedEvents", """
+    SELECT (COUNT(?crashEvent) AS ?crashCount) ?location
+    WHERE {
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:location ?location .
+    }
+    GROUP BY ?location
+""")
+
+@app.route('/getLocationWithCrashedEvents')
+@response_cache.cached()
+def getLocationWithCrashedEvents():
+    counts = query_counts("byLocation", "getLocationWithCrashedEvents")
+    return jsonify(count_dicts(counts, ["location"]))
+
+queries.register("getLocationWithMostCrashedEvents", """
+    SELECT ?location (COUNT(?crashEvent) AS ?crashCount)
+    WHERE {
+      ?crashEvent onto:location ?location .
+    }
+    GROUP BY ?location
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/getLocationWithMostCrashedEvents')
+@response_cache.cached()
+def getLocationWithMostCrashedEvents():
+    top = query_counts("subjectsByLocation", "getLocationWithMostCrashedEvents")
+    return jsonify(count_dicts(top, ["location"]))
+
+queries.register("getOperatorAndModelMostCrashedEventsInSpecificLocation", """
+    SELECT ?model ?operator (COUNT(?crashEvent) AS ?crashCount)
+    WHERE {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:model ?model .
+      ?drone onto:operator ?operator .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:location ?location .
+    }
+    GROUP BY ?model ?operator
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/getOperatorAndModelMostCrashedEventsInSpecificLocation/<string:location>')
+@response_cache.cached()
+def getOperatorAndModelMostCrashedEventsInSpecificLocation(location):
+    # Locations are "City, Country", so the value is bound as given rather
+    # than capitalized like the single-word parameters
+    top = query_counts(
+        "modelAndOperatorByLocation", "getOperatorAndModelMostCrashedEventsInSpecificLocation", location=location
+    )
+    return jsonify(count_dicts(top, ["model", "operator"]))
+
+queries.register("getInWhichLocationHasMostCrashedFilterByModel", """
+    SELECT ?location (COUNT(?crashEvent) AS ?crashCount)
+    WHERE {
+      ?drone rdf:type onto:Drone .
+      ?drone onto:model ?model .
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:location ?location .
+    }
+    GROUP BY ?location
+    ORDER BY DESC(?crashCount)
+    LIMIT 1
+""")
+
+@app.route('/getInWhichLocationHasMostCrashedFilterByModel/<string:model>')
+@response_cache.cached(model=str.capitalize)
+def getInWhichLocationHasMostCrashedFilterByModel(model):
+    model = model.capitalize()
+    top = query_counts("locationByModel", "getInWhichLocationHasMostCrashedFilterByModel", model=model)
+    return jsonify(count_dicts(top, ["location"]))
+
+@app.route('/queryStats')
+def queryStats():
+    return jsonify(queries.stats())
+
+@app.route('/metrics')
+def metricsReport():
+    return jsonify(metrics.snapshot())
+
+@app.route('/cacheStats')
+def cacheStats():
+    return jsonify(response_cache.stats())
+
+@app.route('/queryBackend')
+def queryBackend():
+    costs = backend.costs() if hasattr(backend, "costs") else None
+    return jsonify({"backend": backend.name, "costs": costs})
+
+# (view, query it materializes, whether the query is a top-1, dimension it is sliced by)
+COUNT_INDEX_CHECKS = [
+    ("byWeather", "countByAllWeatherConditions", False, None),
+    ("crashesByWeather", "countCrashedEventsByWeather", False, "weather"),
+    ("byModel", "whichModelHasMostCrashes", True, None),
+    ("modelByWeather", "modelWithMostCrashesByWeather", True, "weather"),
+    ("byModelAndOperator", "countModelAndOperatorInvolvedInCrash", False, None),
+    ("eventsByPhase", "countAllCrashedByPhase", False, None),
+    ("eventsByPhase", "phaseWithMostCrashedEvents", True, None),
+    ("byLocation", "getLocationWithCrashedEvents", False, None),
+    ("subjectsByLocation", "getLocationWithMostCrashedEvents", True, None),
+    ("operatorAndModelByPhase", "getModelAndOperatorByPhase", True, "phase"),
+    ("operatorAndModelByWeather", "getModelAndOperatorByWeather", True, "weather"),
+    ("operatorByWeather", "getOperatorWithMostCrashedByWeather", True, "weather"),
+    ("modelAndOperatorByLocation", "getOperatorAndModelMostCrashedEventsInSpecificLocation", True, "location"),
+    ("locationByModel", "getInWhichLocationHasMostCrashedFilterByModel", True, "model"),
+]
+
+def count_query(view, limited):
+    def select(**where):
+        return count_index().select(view, 1 if limited else None, **where)
+    return select
+
+# Locally the count queries are answered from the views that materialize them
+for view, query_name, limited, _ in COUNT_INDEX_CHECKS:
+    local_queries[query_name] = count_query(view, limited)
+
+# Where the values of each slicing dimension can be listed from
+DIMENSION_VIEWS = {"weather": "byWeather", "phase": "eventsByPhase", "location": "byLocation", "model": "byModel"}
+
+@app.route('/checkCountIndex')
+def checkCountIndex():
+    index = count_index()
+    g = graph_cache.graph
+    mismatches = []
+    for view, query_name, limited, dimension in COUNT_INDEX_CHECKS:
+        if dimension is None:
+            mismatches += check_consistency(index, g, queries, view, query_name, limited)
+            continue
+        for (value,) in index.counts(DIMENSION_VIEWS[dimension]):
+            mismatches += check_consistency(
+                index, g, queries, view, query_name, limited, **{dimension: value}
+            )
+
+    return jsonify({"revision": index.revision, "consistent": not mismatches, "mismatches": mismatches})
+
+@app.route('/apply_rule')
+def apply_rule():
+    inferred_triples = [str(row[0]) for row in queries.query("dronesWithHighRisk", inferred_graph())]
+    return jsonify(inferred_triples)
+
+
+if __name__ == '__main__':
+    app.run(debug=True)
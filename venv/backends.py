@@ -0,0 +1,278 @@
+import codecs
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.query import ResultRow
+
+from queries import TimedResult
+
+
+class LocalBackend:
+    """Evaluates registry queries in-process against the graph cache's snapshot.
+
+    ``handlers`` maps query names to callables that answer the query from
+    state derived from the snapshot instead, such as a count index. A
+    handler takes the query's bindings as keyword arguments and returns a
+    result with ``vars`` whose rows are the query's rows; its time is
+    recorded against the query like an rdflib evaluation.
+    """
+
+    name = "local"
+    # The dataset is held here, so answers follow the graph cache's revision
+    local = True
+
+    def __init__(self, registry, graph_cache, handlers=None):
+        self.registry = registry
+        self.graph_cache = graph_cache
+        self.handlers = {} if handlers is None else handlers
+
+    def select(self, name, **bindings):
+        # Loading the dataset on first use is not part of the query's time
+        graph = self.graph_cache.graph
+        handler = self.handlers.get(name)
+        if handler is None:
+            return self.registry.query(name, graph, **bindings)
+        start = time.perf_counter()
+        result = handler(**bindings)
+        return TimedResult(result, time.perf_counter() - start, lambda seconds: self.registry.record(name, seconds))
+
+
+class RemoteBackend:
+    """Pushes registry queries down to the dataset's SPARQL endpoint.
+
+    Requests go through one ``requests.Session`` whose connection pool keeps
+    connections to Fuseki alive between queries. Results are requested as
+    SPARQL JSON and decoded row by row while the body is still arriving.
+    """
+
+    name = "remote"
+    local = False
+
+    def __init__(self, registry, query_url, session=None, pool_size=16, timeout=60):
+        self.registry = registry
+        self.query_url = query_url
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def select(self, name, **bindings):
+        start = time.perf_counter()
+        response = self.session.post(
+            self.query_url,
+            data={"query": self.registry.remote_text(name, **bindings)},
+            headers={"Accept": "application/sparql-results+json"},
+            stream=True,
+            timeout=self.timeout,
+        )
+        try:
+            response.raise_for_status()
+            result = SPARQLJSONResult(response)
+        except Exception:
+            # Nothing will iterate the result, so the connection goes back to the pool here
+            response.close()
+            raise
+        return TimedResult(result, time.perf_counter() - start, lambda seconds: self.registry.record(name, seconds))
+
+
+class SPARQLJSONResult:
+    """Incrementally decoded ``application/sparql-results+json`` response.
+
+    The document is walked key by key instead of being parsed in one go.
+    When ``head`` comes before ``results`` (Fuseki's order) each object of
+    ``results.bindings`` is decoded only when the caller asks for the next
+    row, so a large result never sits in memory as one parsed document.
+    Servers that send ``results`` first get their bindings buffered until
+    ``head`` has been read.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = response.iter_content(self.CHUNK_SIZE)
+        self._decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self.vars = None
+        self._buffered = None
+        self._streaming = False
+
+        self._expect("{")
+        for key in self._members("}"):
+            if key == "head":
+                self.vars = [Variable(var) for var in self._decode_value().get("vars", [])]
+            elif key == "results":
+                self._read_results()
+                if self._streaming:
+                    break
+            else:
+                self._decode_value()
+        if self.vars is None:
+            raise ValueError("SPARQL JSON response has no head.vars")
+
+    def __iter__(self):
+        bindings = self._bindings() if self._streaming else (self._buffered or ())
+        try:
+            for binding in bindings:
+                yield ResultRow({Variable(var): _term(value) for var, value in binding.items()}, self.vars)
+        finally:
+            self._response.close()
+
+    def _read_results(self):
+        self._expect("{")
+        for key in self._members("}"):
+            if key != "bindings":
+                self._decode_value()
+                continue
+            self._expect("[")
+            if self.vars is not None:
+                # Leave the stream positioned inside the array for __iter__
+                self._streaming = True
+                return
+            self._buffered = list(self._bindings())
+
+    def _members(self, close):
+        # Yields each key of the object being read, positioned at its value
+        if self._peek() == close:
+            self._pos += 1
+            return
+        while True:
+            key = self._decode_value()
+            self._expect(":")
+            yield key
+            separator = self._peek()
+            self._pos += 1
+            if separator == close:
+                return
+
+    def _bindings(self):
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            separator = self._peek()
+            self._pos += 1
+            if separator == "]":
+                return
+
+    def _fill(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            raise ValueError("SPARQL JSON response ended unexpectedly")
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk)
+        self._pos = 0
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            self._fill()
+
+    def _expect(self, token):
+        found = self._peek()
+        if found != token:
+            raise ValueError(f"Expected {token!r} in SPARQL JSON response, got {found!r}")
+        self._pos += 1
+
+    def _decode_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # The value continues in the next chunk
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+
+def _term(value):
+    kind = value["type"]
+    if kind == "uri":
+        return URIRef(value["value"])
+    if kind == "bnode":
+        return BNode(value["value"])
+    return Literal(value["value"], lang=value.get("xml:lang"), datatype=value.get("datatype"))
+
+
+class AutoBackend:
+    """Chooses the local or the remote backend per query from measured cost.
+
+    Each query keeps an exponentially weighted average of its row-producing
+    time on both backends. Until both have a sample, calls alternate; after
+    that the cheaper backend wins, and every ``explore_every``-th call goes
+    to the other one so a change in data size or server load is noticed.
+    """
+
+    name = "auto"
+    # The local backend's snapshot is kept loaded either way
+    local = True
+
+    def __init__(self, local, remote, explore_every=20, weight=0.3):
+        self.backends = {local.name: local, remote.name: remote}
+        self.explore_every = explore_every
+        self.weight = weight
+        self._costs = {}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def select(self, name, **bindings):
+        backend = self.backends[self.choose(name)]
+        start = time.perf_counter()
+        result = backend.select(name, **bindings)
+        # The chosen backend's result already counts towards the request's stages
+        return TimedResult(
+            result, time.perf_counter() - start, lambda seconds: self._observe(name, backend.name, seconds),
+            stage=None,
+        )
+
+    def choose(self, name):
+        with self._lock:
+            costs = self._costs.setdefault(name, {})
+            calls = self._calls[name] = self._calls.get(name, 0) + 1
+            unmeasured = [backend for backend in self.backends if backend not in costs]
+            if unmeasured:
+                return unmeasured[0]
+            ranked = sorted(costs, key=costs.get)
+            return ranked[-1] if calls % self.explore_every == 0 else ranked[0]
+
+    def costs(self):
+        with self._lock:
+            return {name: dict(costs) for name, costs in self._costs.items()}
+
+    def _observe(self, name, backend, seconds):
+        with self._lock:
+            costs = self._costs.setdefault(name, {})
+            previous = costs.get(backend)
+            costs[backend] = seconds if previous is None else (
+                self.weight * seconds + (1 - self.weight) * previous
+            )
+
+
+def create_backend(mode, registry, graph_cache, query_url, handlers=None):
+    """Build the backend for ``mode``: "local", "remote" or "auto".
+
+    ``handlers`` go to the local backend (see ``LocalBackend``).
+    """
+    local = LocalBackend(registry, graph_cache, handlers)
+    if mode == "local":
+        return local
+    remote = RemoteBackend(registry, query_url)
+    if mode == "remote":
+        return remote
+    if mode == "auto":
+        return AutoBackend(local, remote)
+    raise ValueError(f"Unknown query backend {mode!r}; expected 'local', 'remote' or 'auto'")
@@ -0,0 +1,140 @@
+"""Benchmark every app route against a synthetic dataset.
+
+    python bench.py [--crashes N] [--store crashes.db] [--requests N] [--cache] [--diagnostics] [--json FILE]
+
+Without ``--store`` a dataset of ``--crashes`` events is generated into a
+temporary triple store first. The app is then imported on top of that
+store and each GET route is requested ``--requests`` times through Flask's
+test client. For every route the report gives latency percentiles, the
+mean time of each instrumentation stage (as collected for ``/metrics``,
+so streamed bodies are included) and the process's peak RSS so far. The
+response cache is bypassed unless ``--cache`` is given, so repeated
+requests measure the work rather than cache hits. The endpoints that
+report on the app itself rather than on the dataset are left out unless
+``--diagnostics`` is given; ``/checkCountIndex`` alone runs every
+count query in full.
+
+The app keeps the state it derives from the store in the store, so a
+second run against the same ``--store`` starts from that state, and its
+first request measures a restart instead of the index builds.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from generate import LOCATIONS, MODELS, crash_rows
+from ingest import ingest
+from instrumentation import max_rss_kb, percentile
+
+# Values for the routes' URL parameters; the generated data always has them
+ARGUMENTS = {
+    "weather_condition": "fog",
+    "phase": "landing",
+    "location": LOCATIONS[0],
+    "model": MODELS[0].lower(),
+}
+# Endpoints that report on the app itself rather than on the dataset
+DIAGNOSTICS = {"queryStats", "metricsReport", "cacheStats", "queryBackend", "checkCountIndex"}
+
+
+def routes(app, query, diagnostics=False):
+    """Yield ``(endpoint, url)`` for every GET route of ``app``, parameters filled in.
+
+    The ``DIAGNOSTICS`` endpoints are only included with ``diagnostics``.
+    """
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == "static" or "GET" not in rule.methods:
+            continue
+        if rule.endpoint in DIAGNOSTICS and not diagnostics:
+            continue
+        url = rule.build({name: ARGUMENTS[name] for name in rule.arguments}, append_unknown=False)[1]
+        yield rule.endpoint, url + query.get(rule.endpoint, "")
+
+
+def bench_route(client, metrics, endpoint, url, requests):
+    metrics.reset()
+    latencies = []
+    status = None
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        # Closing the response is what records its timings in metrics
+        response.close()
+        latencies.append(time.perf_counter() - start)
+        status = response.status_code
+    latencies.sort()
+    recorded = metrics.snapshot()["endpoints"].get(endpoint, {})
+    return {
+        "status": status,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "stage_ms": recorded.get("mean_stage_ms", {}),
+        "max_rss_kb": max_rss_kb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--crashes", type=int, default=10_000, help="crash events to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store", help="benchmark this triple store instead of generating one")
+    parser.add_argument("--requests", type=int, default=20, help="requests per route")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--diagnostics", action="store_true", help="also benchmark the diagnostic endpoints")
+    parser.add_argument("--routes", nargs="*", help="only routes whose URL contains one of these")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    query = {}
+    path = args.store
+    if path is not None and not os.path.isfile(path):
+        parser.error(f"--store {path}: no such triple store; ingest.py creates one")
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="crash-bench-"), "crashes.db")
+        start = time.perf_counter()
+        ingest(path, crash_rows(args.crashes, args.seed))
+        print(f"generated {args.crashes} crashes in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        query["filterDataByDate"] = "?date=" + next(crash_rows(1, args.seed))["date"]
+
+    os.environ["CRASH_STORE"] = path
+    import app as crash_app
+
+    if not args.cache:
+        crash_app.response_cache.revision = lambda: None
+    client = crash_app.app.test_client()
+
+    # The first request opens the store and builds the indexes behind the
+    # routes, or resumes them from the state saved by an earlier run
+    start = time.perf_counter()
+    client.get("/countAllCrashedByPhase").close()
+    results = {"load_s": time.perf_counter() - start, "max_rss_kb": max_rss_kb(), "routes": {}}
+    print(f"first request (open + index builds or resume): {results['load_s']:.2f}s, peak RSS {max_rss_kb()} KiB")
+
+    print(f"{'route':<60} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  stages (mean ms)")
+    for endpoint, url in routes(crash_app.app, query, args.diagnostics):
+        if args.routes and not any(part in url for part in args.routes):
+            continue
+        result = bench_route(client, crash_app.metrics, endpoint, url, args.requests)
+        results["routes"][url] = result
+        stages = " ".join(f"{name}={ms:.2f}" for name, ms in result["stage_ms"].items())
+        print(
+            f"{url[:60]:<60} {result['p50_ms']:9.2f} {result['p90_ms']:9.2f} {result['p99_ms']:9.2f} "
+            f"{result['max_ms']:9.2f}  {stages}"
+            + ("" if result["status"] == 200 else f"  (status {result['status']})")
+        )
+    results["max_rss_kb"] = max_rss_kb()
+    print(f"peak RSS {results['max_rss_kb']} KiB")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
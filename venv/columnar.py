@@ -0,0 +1,437 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
+from itertools import chain, groupby, product
+from operator import itemgetter
+
+from rdflib import Literal, RDF, Variable
+from rdflib.term import Identifier
+
+from graph_cache import objects_by_subject
+from queries import ONTO
+from triple_store import decode_terms, encode_term, pack_state, unpack_state
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Drone attributes, then crash event attributes; "drone" and "crash" are the keys
+DRONE_COLUMNS = {"model": ONTO.model, "operator": ONTO.operator}
+CRASH_COLUMNS = {
+    "date": ONTO.date,
+    "location": ONTO.location,
+    "phase": ONTO.phase,
+    "weather": ONTO.weather,
+}
+COLUMNS = ("drone", "crash") + tuple(DRONE_COLUMNS) + tuple(CRASH_COLUMNS)
+# Built once, since ONTO.<name> makes a new URIRef on every access
+DRONE, INVOLVED_IN_CRASH = ONTO.Drone, ONTO.involvedInCrash
+PREDICATES = dict(crash=INVOLVED_IN_CRASH, **DRONE_COLUMNS, **CRASH_COLUMNS)
+# Triples that change which rows a drone has when it is their subject
+DRONE_PREDICATES = {RDF.type, INVOLVED_IN_CRASH, *DRONE_COLUMNS.values()}
+
+MISSING = -1
+
+# Largest combined key space a NumPy group-by counts with bincount instead of sorting
+BINCOUNT_LIMIT = 1 << 22
+# Rows ``select`` filters at a time; a page stops reading once it is full
+FILTER_CHUNK = 1 << 13
+
+# ``multi`` is set when some drone or crash has several values in the column
+Columns = namedtuple("Columns", ["codes", "values", "lookup", "multi"])
+
+
+class CrashTable:
+    """Dictionary-encoded, column-oriented copy of the crash data.
+
+    There is one row per (drone, crash event) pair and combination of
+    their attribute values, so an attribute with several values makes one
+    row per value, as the solutions of a SPARQL pattern would. A drone
+    that never crashed gets one row with no crash. Every column is an
+    ``array('i')`` of codes into that column's list of distinct terms, so a
+    row costs ``4 * len(COLUMNS)`` bytes whatever the strings look like.
+    A missing value is coded ``MISSING``.
+
+    Rows are sorted by drone IRI, so row order matches the routes'
+    ``ORDER BY ?drone`` and a keyset cursor is a binary search. ``apply``
+    updates the rows of the drones a change touches and leaves the other
+    rows as they are. Filters and group-bys run on NumPy views of the
+    code arrays when NumPy is installed and fall back to plain Python loops
+    over the arrays otherwise.
+    """
+
+    def __init__(self):
+        self.revision = None
+        self._data = self._encode([], {}, set())
+
+    def __len__(self):
+        return len(self._data["drone"].codes)
+
+    def load(self, graph, revision=None):
+        drones = sorted(graph.subjects(RDF.type, DRONE), key=str)
+        found = objects_by_subject(graph, list(PREDICATES.values()))
+        objects = lambda subject, predicate: found[predicate].get(subject, ())
+        multi = set()
+        rows = [row for drone in drones for row in _drone_rows(drone, objects, multi)]
+        data = self._encode(rows, {"drone": drones}, multi)
+        # One reference assignment, so readers see either the old or the new table
+        self._data = data
+        self.revision = revision
+
+    def apply(self, graph, added=(), removed=(), revision=None):
+        """Update the table to ``graph``, which differs from the loaded one by ``added`` and ``removed``.
+
+        Only the rows of the drones those triples touch are built again,
+        from lookups in ``graph``, and spliced into copies of the columns;
+        the rest of the rows keep their codes.
+        """
+        drones, crashes = set(), set()
+        for s, p, o in chain(added, removed):
+            if p in DRONE_PREDICATES:
+                drones.add(s)
+            elif p in CRASH_COLUMNS.values():
+                crashes.add(s)
+        for crash in crashes:
+            drones.update(graph.subjects(INVOLVED_IN_CRASH, crash))
+        data = self._data
+        multi = {column for column, columns in data.items() if columns.multi}
+        objects = lambda subject, predicate: list(graph.objects(subject, predicate))
+        values = {column: list(columns.values) for column, columns in data.items()}
+        lookups = {column: dict(columns.lookup) for column, columns in data.items()}
+        codes = {column: array("i") for column in COLUMNS}
+        old_codes = [data[column].codes for column in COLUMNS]
+        new_codes = [codes[column] for column in COLUMNS]
+        key = _drone_key(data)
+        rows = range(len(data["drone"].codes))
+        position = 0
+        for drone in sorted(drones, key=str):
+            start = bisect_left(rows, str(drone), position, key=key)
+            stop = bisect_right(rows, str(drone), start, key=key)
+            for old, new in zip(old_codes, new_codes):
+                new.extend(old[position:start])
+            if (drone, RDF.type, DRONE) in graph:
+                for row in _drone_rows(drone, objects, multi):
+                    for column, value, new in zip(COLUMNS, row, new_codes):
+                        new.append(_code(value, values[column], lookups[column]))
+            position = stop
+        for old, new in zip(old_codes, new_codes):
+            new.extend(old[position:])
+        self._data = {
+            column: Columns(codes[column], values[column], lookups[column], column in multi) for column in COLUMNS
+        }
+        self.revision = revision
+
+    def on_swap(self, old, new, added, removed):
+        if self.revision == new.revision:
+            return
+        if old is None or self.revision != old.revision:
+            self.load(new.graph, new.revision)
+            return
+        if len(added) + len(removed) > len(new.graph) // 2:
+            self.load(new.graph, new.revision)
+        else:
+            self.apply(new.graph, added, removed, new.revision)
+
+    def dump(self):
+        """Return the columns as bytes for ``restore``."""
+        data = self._data
+        header = {
+            "columns": {
+                column: {"values": [encode_term(value) for value in columns.values], "multi": columns.multi}
+                for column, columns in data.items()
+            },
+        }
+        return pack_state(header, [data[column].codes for column in COLUMNS])
+
+    def restore(self, data, revision):
+        """Load columns ``dump`` made at ``revision``; False if the table had other columns."""
+        state = unpack_state(data)
+        if state is None or tuple(state[0].get("columns", ())) != COLUMNS:
+            return False
+        header, codes = state
+        columns = {}
+        for (column, saved), column_codes in zip(header["columns"].items(), codes):
+            values = decode_terms(saved["values"])
+            lookup = {value: code for code, value in enumerate(values)}
+            columns[column] = Columns(column_codes, values, lookup, saved["multi"])
+        self._data = columns
+        self.revision = revision
+        return True
+
+    def nbytes(self):
+        return sum(column.codes.itemsize * len(column.codes) for column in self._data.values())
+
+    def code(self, column, value):
+        """Return the code of ``value`` in ``column``, or None if it never occurs."""
+        return self._data[column].lookup.get(_term(value))
+
+    def select(self, columns, after=None, require=(), optional=(), **where):
+        """Return the rows matching ``where`` as a SPARQL-result-like object.
+
+        ``where`` holds equality filters, ``require`` columns that must not
+        be missing and ``after`` a drone IRI to continue after. ``optional``
+        columns are matched like one SPARQL ``OPTIONAL`` block: rows that
+        have all of them are returned, and each combination of the other
+        columns that has no such row comes back once with them blanked.
+
+        The drone and all the columns named here make up the pattern the
+        rows stand for; rows that only differ in other columns are returned
+        once, like the pattern's solutions. The result has ``vars`` and
+        yields tuples of terms (None where missing), which is what
+        ``streaming.result_rows`` expects.
+        """
+        data = self._data
+        indices = self._filter(data, after, require, where, lazy=True)
+        pattern = list(dict.fromkeys(["drone", *columns, *require, *optional, *where]))
+        return TableResult(data, columns, indices, pattern, optional)
+
+    def group_count(self, by, require=(), **where):
+        """Return ``{(value, ...): count}`` over ``by`` for the crashes matching ``where``.
+
+        Counts what ``COUNT(?crashEvent)`` counts for a ``GROUP BY`` over
+        a typed drone's crashes, the "crash" facts of a count index view:
+        one per solution of the pattern made of the drone, the crash, ``by``,
+        ``require`` and ``where``. Rows missing one of those columns are left
+        out, and rows that only differ outside the pattern count once.
+        """
+        data = self._data
+        pattern = list(dict.fromkeys(["drone", "crash", *by, *require, *where]))
+        indices = self._filter(data, None, [column for column in pattern[1:] if column not in where], where)
+        # Rows differing only outside the pattern are copies of one solution
+        deduplicate = any(data[column].multi for column in COLUMNS if column not in pattern)
+        if numpy is not None:
+            counts = self._numpy_group_count(data, by, pattern if deduplicate else None, indices)
+        else:
+            rows = (tuple(data[column].codes[i] for column in pattern) for i in indices)
+            if deduplicate:
+                rows = set(rows)
+            positions = [pattern.index(column) for column in by]
+            counts = Counter(tuple(row[position] for position in positions) for row in rows)
+        return {
+            tuple(data[column].values[code] for column, code in zip(by, key)): count
+            for key, count in counts.items()
+        }
+
+    def top(self, by, k=1, require=(), **where):
+        """Return the ``k`` largest ``(group values, count)`` pairs of ``group_count``, largest first."""
+        counts = self.group_count(by, require, **where)
+        return heapq.nlargest(k, counts.items(), key=itemgetter(1))
+
+    def _filter(self, data, after, require, where, lazy=False):
+        # The matching row indices from ``after`` on: a NumPy array or list,
+        # or with ``lazy`` an iterator that filters a chunk at a time
+        start = 0
+        drones = data["drone"]
+        if after is not None:
+            # Rows are in drone IRI order, so the first row after the cursor is a binary search
+            start = bisect_right(range(len(drones.codes)), str(after), key=_drone_key(data))
+        conditions = []
+        for column, value in where.items():
+            code = data[column].lookup.get(_term(value))
+            if code is None:
+                return range(0)
+            conditions.append((data[column].codes, code, True))
+        for column in require:
+            conditions.append((data[column].codes, MISSING, False))
+
+        stop = len(drones.codes)
+        if not conditions:
+            return range(start, stop)
+        if lazy:
+            return _matching(conditions, start, stop)
+        if numpy is not None:
+            mask = numpy.ones(stop - start, dtype=bool)
+            for codes, code, equal in conditions:
+                view = numpy.frombuffer(codes, dtype=numpy.int32)[start:]
+                mask &= (view == code) if equal else (view != code)
+            return numpy.flatnonzero(mask) + start
+
+        indices = range(start, stop)
+        for codes, code, equal in conditions:
+            if equal:
+                indices = [i for i in indices if codes[i] == code]
+            else:
+                indices = [i for i in indices if codes[i] != code]
+        return list(indices)
+
+    @staticmethod
+    def _numpy_group_count(data, by, pattern, indices):
+        # With a pattern, its distinct solutions are counted rather than the rows
+        if isinstance(indices, range):
+            indices = slice(indices.start, indices.stop)
+        column = lambda name: numpy.frombuffer(data[name].codes, dtype=numpy.int32)[indices]
+        if pattern is None:
+            codes = [column(name) for name in by]
+            rows = len(column("drone"))
+        else:
+            first = _distinct_rows(
+                [column(name) for name in pattern], [len(data[name].values) for name in pattern]
+            )
+            codes = [column(name)[first] for name in by]
+            rows = len(first)
+        if not by:
+            return {(): rows} if rows else {}
+        key = numpy.zeros(rows, dtype=numpy.int64)
+        space = 1
+        for name, name_codes in zip(by, codes):
+            key = key * len(data[name].values) + name_codes
+            space *= len(data[name].values)
+        if space <= BINCOUNT_LIMIT:
+            counts = numpy.bincount(key, minlength=space)
+            combined = numpy.flatnonzero(counts)
+            counts = counts[combined]
+        else:
+            combined, counts = numpy.unique(key, return_counts=True)
+        grouped = {}
+        for value, count in zip(combined.tolist(), counts.tolist()):
+            group = []
+            for name in reversed(by):
+                value, code = divmod(value, len(data[name].values))
+                group.append(code)
+            grouped[tuple(reversed(group))] = count
+        return grouped
+
+    @staticmethod
+    def _encode(rows, presorted, multi):
+        data = {}
+        for position, column in enumerate(COLUMNS):
+            if column in presorted:
+                values = list(presorted[column])
+            else:
+                values = sorted({row[position] for row in rows if row[position] is not None}, key=str)
+            lookup = {value: code for code, value in enumerate(values)}
+            codes = array("i", (
+                MISSING if row[position] is None else lookup[row[position]] for row in rows
+            ))
+            data[column] = Columns(codes, values, lookup, column in multi)
+        return data
+
+
+class TableResult:
+    """Selected table rows, iterated as tuples of terms like an rdflib SELECT result."""
+
+    def __init__(self, data, columns, indices, pattern, optional=()):
+        self.vars = [Variable(column) for column in columns]
+        self._columns = [(column, data[column]) for column in columns]
+        self._drones = data["drone"].codes
+        self._indices = indices
+        self._keys = [data[column].codes for column in pattern if column not in optional]
+        self._optional = [data[column].codes for column in optional]
+        self._blank = set(optional)
+        # Rows differing only outside the pattern are copies of one solution
+        self._deduplicate = any(data[column].multi for column in COLUMNS if column not in pattern)
+
+    def __iter__(self):
+        if not self._optional and not self._deduplicate:
+            for i in self._indices:
+                yield self._row(i)
+            return
+        # The pattern includes the drone, so a solution never spans two drones
+        for _, rows in groupby(self._indices, key=self._drones.__getitem__):
+            yield from self._solutions(rows)
+
+    def _solutions(self, rows):
+        keys, optional = self._keys, self._optional
+        seen = set()
+        matched = set()
+        unmatched = {}
+        for i in rows:
+            key = tuple(codes[i] for codes in keys)
+            if any(codes[i] == MISSING for codes in optional):
+                unmatched.setdefault(key, i)
+                continue
+            matched.add(key)
+            if self._deduplicate:
+                solution = key + tuple(codes[i] for codes in optional)
+                if solution in seen:
+                    continue
+                seen.add(solution)
+            yield self._row(i)
+        for key, i in unmatched.items():
+            if key not in matched:
+                yield self._row(i, self._blank)
+
+    def _row(self, i, blank=()):
+        return tuple(
+            None if name in blank or column.codes[i] == MISSING else column.values[column.codes[i]]
+            for name, column in self._columns
+        )
+
+
+def _drone_rows(drone, objects, multi):
+    # The rows of one drone, crashes in IRI order; the columns it or one of
+    # its crashes has several values in are added to ``multi``
+    attributes = list(product(*(
+        _values(objects(drone, predicate), column, multi) for column, predicate in DRONE_COLUMNS.items()
+    )))
+    crashes = sorted(objects(drone, INVOLVED_IN_CRASH), key=str)
+    if len(crashes) > 1:
+        multi.add("crash")
+    if not crashes:
+        return [(drone, None) + values + (None,) * len(CRASH_COLUMNS) for values in attributes]
+    rows = []
+    for crash in crashes:
+        details = list(product(*(
+            _values(objects(crash, predicate), column, multi) for column, predicate in CRASH_COLUMNS.items()
+        )))
+        rows.extend((drone, crash) + values + more for values in attributes for more in details)
+    return rows
+
+
+def _matching(conditions, start, stop):
+    if numpy is None:
+        for i in range(start, stop):
+            if all((codes[i] == code) == equal for codes, code, equal in conditions):
+                yield i
+        return
+    views = [(numpy.frombuffer(codes, dtype=numpy.int32), code, equal) for codes, code, equal in conditions]
+    for low in range(start, stop, FILTER_CHUNK):
+        high = min(low + FILTER_CHUNK, stop)
+        mask = numpy.ones(high - low, dtype=bool)
+        for codes, code, equal in views:
+            chunk = codes[low:high]
+            mask &= (chunk == code) if equal else (chunk != code)
+        yield from (numpy.flatnonzero(mask) + low).tolist()
+
+
+def _distinct_rows(codes, sizes):
+    # Positions of the first row of each distinct combination of ``codes``;
+    # one int64 key per row when the combinations fit in it, which sorts far
+    # faster than the rows as tuples
+    space = 1
+    for size in sizes:
+        space *= max(size, 1)
+    if space >= 1 << 63:
+        return numpy.unique(numpy.stack(codes, axis=1), axis=0, return_index=True)[1]
+    key = numpy.zeros(len(codes[0]), dtype=numpy.int64)
+    for column_codes, size in zip(codes, sizes):
+        key = key * max(size, 1) + column_codes
+    return numpy.unique(key, return_index=True)[1]
+
+
+def _values(found, column, multi):
+    if len(found) > 1:
+        multi.add(column)
+    return found or (None,)
+
+
+def _code(value, values, lookup):
+    if value is None:
+        return MISSING
+    code = lookup.get(value)
+    if code is None:
+        code = lookup[value] = len(values)
+        values.append(value)
+    return code
+
+
+def _drone_key(data):
+    # The drone IRI of a row, for binary searches over the rows
+    codes, values = data["drone"].codes, data["drone"].values
+    return lambda row: str(values[codes[row]])
+
+
+def _term(value):
+    return value if isinstance(value, Identifier) else Literal(value)
@@ -0,0 +1,130 @@
+"""Generate a synthetic crash dataset in the crashedDrones schema.
+
+    python generate.py CRASHES [--seed N] [--format csv|nt] [--out FILE]
+    python generate.py CRASHES --store crashes.db
+
+Crash events are skewed the way real incident data is: a few models,
+operators and locations account for most crashes (Zipf-distributed),
+weather and flight phase follow fixed uneven frequencies, and a minority of
+drones crash again and again. The output is a crash CSV that
+``ingest.py`` reads, N-Triples, or rows loaded straight into a store.
+Rows are produced one at a time, so 1M crashes take no more memory than
+1k.
+"""
+import argparse
+import csv
+import random
+import sys
+from datetime import date, timedelta
+from itertools import accumulate
+
+from ingest import FIELDS, crash_iri, crash_triples, drone_iri, ingest
+
+# Names stay unchanged by str.capitalize(), which the routes apply to their parameters
+MODELS = [
+    "Bayraktar", "Orion", "Heron", "Hermes", "Shahed", "Reaper", "Predator", "Lancet",
+    "Switchblade", "Mohajer", "Forpost", "Wing loong", "Anka", "Akinci", "Ababil", "Searcher",
+]
+LOCATIONS = [
+    "Kyiv, Ukraine", "Komotini, Greece", "Gaza, Palestine", "Kharkiv, Ukraine", "Idlib, Syria",
+    "Marib, Yemen", "Tripoli, Libya", "Stepanakert, Azerbaijan", "Mosul, Iraq", "Kandahar, Afghanistan",
+    "Odesa, Ukraine", "Aleppo, Syria", "Sanaa, Yemen", "Benghazi, Libya", "Erbil, Iraq",
+    "Kherson, Ukraine", "Zaporizhzhia, Ukraine", "Donetsk, Ukraine", "Raqqa, Syria", "Aden, Yemen",
+    "Sirte, Libya", "Kirkuk, Iraq", "Herat, Afghanistan", "Mogadishu, Somalia", "Tigray, Ethiopia",
+]
+WEATHER = {"Clear": 45, "Wind": 20, "Fog": 12, "Heavy Rain/Snow": 10, "Rain": 8, "Snow": 5}
+PHASES = {"Cruise": 40, "Landing": 25, "Takeoff": 20, "Approach": 10, "Taxi": 5}
+OPERATORS_PER_MODEL = 3
+
+FIRST_DAY = date(2015, 1, 1)
+DAYS = 10 * 365
+
+# Crashes per drone on average; the per-drone counts are Zipf-skewed around it,
+# more gently than the categories, so no single drone dominates
+CRASHES_PER_DRONE = 3
+DRONE_EXPONENT = 0.5
+ZIPF_EXPONENT = 1.1
+
+
+def zipf_weights(n, exponent=ZIPF_EXPONENT):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def crash_rows(crashes, seed=0):
+    """Yield ``crashes`` ingest-style ``{field: value}`` rows."""
+    rng = random.Random(seed)
+    drones = max(1, crashes // CRASHES_PER_DRONE)
+    # Drone numbers are shuffled so the busiest drones are spread over the IRI order
+    numbers = list(range(drones))
+    rng.shuffle(numbers)
+    drone_weights = zipf_weights(drones, DRONE_EXPONENT)
+    model_weights = zipf_weights(len(MODELS))
+    operator_weights = zipf_weights(OPERATORS_PER_MODEL)
+    location_weights = zipf_weights(len(LOCATIONS))
+    weather, weather_weights = list(WEATHER), list(accumulate(WEATHER.values()))
+    phases, phase_weights = list(PHASES), list(accumulate(PHASES.values()))
+
+    # A drone's model and operator depend only on its number, so they stay
+    # the same on every crash without keeping a table of all drones
+    def drone_attributes(number):
+        drone_rng = random.Random(f"{seed}:{number}")
+        model = drone_rng.choices(MODELS, cum_weights=model_weights)[0]
+        operator = drone_rng.choices(range(OPERATORS_PER_MODEL), cum_weights=operator_weights)[0]
+        return model, f"{model} operator {operator + 1}"
+
+    batch = 10_000
+    for start in range(0, crashes, batch):
+        k = min(batch, crashes - start)
+        picks = rng.choices(numbers, cum_weights=drone_weights, k=k)
+        locations = rng.choices(LOCATIONS, cum_weights=location_weights, k=k)
+        weathers = rng.choices(weather, cum_weights=weather_weights, k=k)
+        phase_picks = rng.choices(phases, cum_weights=phase_weights, k=k)
+        for number, location, condition, phase in zip(picks, locations, weathers, phase_picks):
+            model, operator = drone_attributes(number)
+            yield {
+                "drone": f"drone{number}",
+                "model": model,
+                "operator": operator,
+                "date": (FIRST_DAY + timedelta(days=rng.randrange(DAYS))).isoformat(),
+                "location": location,
+                "phase": phase,
+                "weather": condition,
+            }
+
+
+def write_csv(rows, file):
+    writer = csv.DictWriter(file, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_ntriples(rows, file):
+    for number, row in enumerate(rows, 1):
+        for triple in crash_triples(row, drone_iri(row["drone"]), crash_iri(number)):
+            file.write(" ".join(term.n3() for term in triple) + " .\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("crashes", type=int, help="number of crash events")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "nt"], default="csv")
+    parser.add_argument("--out", help="output file (default: standard output)")
+    parser.add_argument("--store", help="load the crashes into this triple store instead")
+    args = parser.parse_args(argv)
+
+    rows = crash_rows(args.crashes, args.seed)
+    if args.store:
+        written, revision = ingest(args.store, rows)
+        print(f"{written} crashes, store at revision {revision}")
+        return
+    file = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        (write_csv if args.format == "csv" else write_ntriples)(rows, file)
+    finally:
+        if args.out:
+            file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from rdflib import Graph
+
+from instrumentation import stage
+from triple_store import SQLiteStore, load_derived, save_derived, store_revision
+
+log = logging.getLogger(__name__)
+
+# A loaded copy of the dataset. Snapshots are never mutated once published,
+# so a request can hold on to one for its whole lifetime without locking.
+# digest is a hash of the download the graph was parsed from, loaded_at when
+# the dataset was last downloaded and found to be this snapshot.
+Snapshot = namedtuple(
+    "Snapshot", ["graph", "revision", "etag", "last_modified", "probe", "digest", "loaded_at"]
+)
+
+REVISION_PROBE = "SELECT (COUNT(*) AS ?n) WHERE { ?s ?p ?o }"
+
+
+class GraphCache:
+    """Keeps one parsed copy of the Fuseki dataset for the whole app.
+
+    The dataset is downloaded on first use and then revalidated every
+    ``interval`` seconds from a background thread. Revalidation uses a
+    conditional GET when the store hands out ``ETag``/``Last-Modified``
+    validators, and falls back to a triple-count probe against the SPARQL
+    endpoint otherwise. A changed dataset is parsed into a fresh graph and
+    published by swapping ``self._snapshot``, which is a single reference
+    assignment, so readers never see a half-loaded graph.
+
+    The count probe cannot see an update that keeps the number of triples,
+    such as a DELETE/INSERT changing one crash's weather. Without
+    validators the dataset is therefore downloaded again once the snapshot
+    is ``max_age`` seconds old, and published only if the download differs
+    from the one the snapshot was parsed from.
+    """
+
+    def __init__(self, data_url, query_url=None, interval=30, max_age=300, fmt="turtle", session=None):
+        self.data_url = data_url
+        self.query_url = query_url or data_url.rsplit("/", 1)[0] + "/query"
+        self.interval = interval
+        self.max_age = max_age
+        self.fmt = fmt
+        self.session = session or requests.Session()
+        self._snapshot = None
+        self._subscribers = []
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with stage("fetch"):
+                self.refresh()
+            self.start()
+            snapshot = self._snapshot
+        return snapshot
+
+    @property
+    def graph(self):
+        return self.snapshot.graph
+
+    @property
+    def revision(self):
+        return self.snapshot.revision
+
+    def subscribe(self, callback):
+        """Call ``callback(old, new, added, removed)`` on every snapshot swap.
+
+        Callbacks run before ``new`` is published, so state derived from the
+        graph is already up to date by the time readers see the new revision.
+        ``added`` and ``removed`` are the triples that turn ``old``'s graph
+        into ``new``'s, worked out once per swap for all subscribers; on the
+        first load there is no ``old`` and both are None.
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def start(self):
+        if self._thread is not None or not self.interval:
+            return
+        self._thread = threading.Thread(
+            target=self._poll, name="graph-cache-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def refresh(self):
+        """Revalidate against the store; return True if a new snapshot was published."""
+        with self._refresh_lock:
+            current = self._snapshot
+            if current is None:
+                return self._publish(self._fetch(), probe=None)
+
+            if current.etag or current.last_modified:
+                response = self._fetch(current)
+                if response.status_code == 304 or (
+                    response.headers.get("ETag") == current.etag
+                    and response.headers.get("Last-Modified") == current.last_modified
+                ):
+                    return False
+                return self._publish(response, probe=None)
+
+            probe = self._probe()
+            if probe is not None and probe == current.probe and not self._expired(current):
+                return False
+            return self._publish(self._fetch(), probe=probe)
+
+    def _expired(self, snapshot):
+        return self.max_age is not None and time.time() - snapshot.loaded_at >= self.max_age
+
+    def _poll(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("Refreshing %s failed; keeping the current snapshot", self.data_url)
+
+    def _fetch(self, current=None):
+        headers = {}
+        if current is not None:
+            if current.etag:
+                headers["If-None-Match"] = current.etag
+            if current.last_modified:
+                headers["If-Modified-Since"] = current.last_modified
+        response = self.session.get(self.data_url, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def _probe(self):
+        try:
+            response = self.session.get(
+                self.query_url,
+                params={"query": REVISION_PROBE},
+                headers={"Accept": "application/sparql-results+json"},
+            )
+            response.raise_for_status()
+            return response.json()["results"]["bindings"][0]["n"]["value"]
+        except (requests.RequestException, ValueError, LookupError):
+            # No usable probe; treat the dataset as changed so it gets reloaded.
+            return None
+
+    def _publish(self, response, probe):
+        old = self._snapshot
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        digest = hashlib.sha256(response.content).hexdigest()
+        if old is not None and old.digest == digest:
+            # The same bytes as the current snapshot, which is just fresh again
+            self._snapshot = old._replace(
+                etag=etag, last_modified=last_modified, probe=probe or old.probe, loaded_at=time.time()
+            )
+            return False
+
+        g = Graph()
+        g.parse(data=response.content, format=self.fmt)
+        if probe is None and not (etag or last_modified):
+            probe = str(len(g))
+
+        return self._swap(old, Snapshot(
+            graph=g,
+            revision=(old.revision + 1) if old else 1,
+            etag=etag,
+            last_modified=last_modified,
+            probe=probe,
+            digest=digest,
+            loaded_at=time.time(),
+        ))
+
+    def _swap(self, old, new):
+        added = removed = None
+        if old is not None and self._subscribers:
+            added, removed = graph_delta(old.graph, new.graph)
+        for callback in self._subscribers:
+            try:
+                callback(old, new, added, removed)
+            except Exception:
+                log.exception("Graph cache subscriber %r failed", callback)
+        self._snapshot = new
+        return True
+
+
+class StoreCache(GraphCache):
+    """A ``GraphCache`` over the on-disk triple store written by ``ingest.py``.
+
+    Nothing is downloaded or parsed: a snapshot is a graph over an
+    ``SQLiteStore`` pinned to the store's current revision, so opening one
+    is a metadata read however large the store is. Revalidation compares
+    that revision with the one on disk, and the snapshot's revision is the
+    store's own.
+
+    State derived from the graph can be kept in the store too (see
+    ``persist``), so a restarted app resumes from it instead of rebuilding
+    it from a scan of every triple.
+    """
+
+    def __init__(self, path, interval=30):
+        # Checked at startup; otherwise every request fails opening the store
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No triple store at {path}; ingest.py creates one")
+        super().__init__(path, query_url=path, interval=interval)
+        self._persisted = {}
+        self._saved = {}
+
+    def persist(self, name, state):
+        """Save ``state`` in the store under ``name`` and resume from it on the first load.
+
+        ``state`` is a subscriber with a ``revision`` attribute, ``dump()``
+        returning bytes and ``restore(data, revision)`` loading them back;
+        ``restore`` returns False when the data no longer fits, and the
+        state is then built as usual. What was appended since the save
+        reaches it as an ordinary swap. Saving happens in the background
+        after every swap that changed it.
+        """
+        self._persisted[name] = state
+        return state
+
+    def refresh(self):
+        with self._refresh_lock:
+            current = self._snapshot
+            revision = store_revision(self.data_url)
+            if current is not None and current.revision == revision:
+                return False
+            new = self._open(revision)
+            if current is None:
+                self._resume(new)
+            self._swap(current, new)
+        if self._persisted:
+            threading.Thread(target=self.save, name="store-cache-save", daemon=True).start()
+        return True
+
+    def save(self):
+        """Save every persisted state that changed since it was last saved."""
+        with self._refresh_lock:
+            for name, state in self._persisted.items():
+                revision = state.revision
+                if revision is None or self._saved.get(name) == revision:
+                    continue
+                save_derived(self.data_url, name, revision, state.dump())
+                self._saved[name] = revision
+
+    def _open(self, revision):
+        return Snapshot(
+            graph=Graph(store=SQLiteStore(self.data_url, revision)),
+            revision=revision,
+            etag=None,
+            last_modified=None,
+            probe=revision,
+            digest=None,
+            loaded_at=time.time(),
+        )
+
+    def _resume(self, new):
+        # States saved at the same revision catch up with the same delta
+        deltas = {}
+        for name, state in self._persisted.items():
+            saved = load_derived(self.data_url, name)
+            if saved is None or saved[0] > new.revision:
+                continue
+            revision, data = saved
+            try:
+                if not state.restore(data, revision):
+                    continue
+                self._saved[name] = revision
+                if revision != new.revision:
+                    old = self._open(revision)
+                    if revision not in deltas:
+                        deltas[revision] = graph_delta(old.graph, new.graph)
+                    state.on_swap(old, new, *deltas[revision])
+            except Exception:
+                log.exception("Resuming %s from %s failed; it is built again", name, self.data_url)
+
+
+def objects_by_subject(graph, predicates):
+    """Return ``{predicate: {subject: [objects]}}`` from one scan per predicate.
+
+    Bulk builds use this instead of a lookup per subject, which matters most
+    for graphs over an on-disk store where every lookup is a query.
+    """
+    found = {}
+    for predicate in predicates:
+        objects = found[predicate] = {}
+        for subject, obj in graph.subject_objects(predicate):
+            objects.setdefault(subject, []).append(obj)
+    return found
+
+
+def graph_delta(old, new):
+    """Return the ``(added, removed)`` triple sets that turn ``old`` into ``new``."""
+    if isinstance(old.store, SQLiteStore) and isinstance(new.store, SQLiteStore) and (
+        old.store.path == new.store.path and old.store.revision <= new.store.revision
+    ):
+        # The store is append-only, so the delta is read off the revision column
+        return new.store.added_since(old.store.revision), set()
+    old_triples = set(old)
+    new_triples = set(new)
+    return new_triples - old_triples, old_triples - new_triples
@@ -0,0 +1,150 @@
+"""Load crash CSVs into the on-disk triple store the app can serve from.
+
+    python ingest.py crashes.db crashes.csv [more.csv ...] [--batch-size N]
+                     [--column field=Header ...]
+
+Each CSV row is one crash event. Its drone and crash attributes become
+triples in the ``http://ubt/crashedDrones#`` schema, and rows are
+committed in batches of ``--batch-size``, so memory stays bounded however
+large the input is. Running the command again on the same store appends:
+crash IRIs continue from the last number used, rows naming an existing
+drone attach new crashes to it, and every batch is a new store revision
+that a running app picks up on its next refresh. Crashes, and drones
+without a name or with no letter or digit in it, get numbered IRIs like
+``crash-12`` that no drone name maps to.
+"""
+import argparse
+import csv
+import re
+import sys
+
+from rdflib import Literal, RDF
+
+from queries import ONTO
+from triple_store import TripleWriter
+
+DRONE_FIELDS = {"model": ONTO.model, "operator": ONTO.operator}
+CRASH_FIELDS = {
+    "date": ONTO.date,
+    "location": ONTO.location,
+    "phase": ONTO.phase,
+    "weather": ONTO.weather,
+}
+# Fields read from each row; "drone" names the drone, the others are attributes
+FIELDS = ("drone",) + tuple(DRONE_FIELDS) + tuple(CRASH_FIELDS)
+
+BATCH_SIZE = 5000
+
+NOT_NAME = re.compile(r"\W+")
+
+
+def crash_triples(row, drone, crash):
+    """Return the triples for one crash ``row`` (a ``{field: value}`` dict)."""
+    triples = [
+        (drone, RDF.type, ONTO.Drone),
+        (drone, ONTO.involvedInCrash, crash),
+        (crash, RDF.type, ONTO.CrashEvent),
+    ]
+    for fields, subject in ((DRONE_FIELDS, drone), (CRASH_FIELDS, crash)):
+        for field, predicate in fields.items():
+            value = (row.get(field) or "").strip()
+            if value:
+                triples.append((subject, predicate, Literal(value)))
+    return triples
+
+
+def drone_iri(name):
+    """Return the IRI of the drone called ``name``, or None if it has no letter or digit."""
+    local = NOT_NAME.sub("_", name.strip()).strip("_")
+    return ONTO[local] if local else None
+
+
+# Numbered IRIs have a hyphen, which drone_iri never leaves in a name, so a
+# named drone cannot take the IRI of a generated drone or crash
+def crash_iri(number):
+    return ONTO[f"crash-{number}"]
+
+
+def unnamed_drone_iri(number):
+    return ONTO[f"drone-{number}"]
+
+
+def ingest(path, rows, batch_size=BATCH_SIZE):
+    """Append ``rows`` of ``{field: value}`` dicts to the store at ``path``.
+
+    Returns ``(rows written, store revision)``.
+    """
+    writer = TripleWriter(path)
+    try:
+        crashes = writer.counter("crashes")
+        drones = writer.counter("drones")
+        written = 0
+        batch = []
+        for row in rows:
+            drone = drone_iri(row.get("drone") or "")
+            if drone is None:
+                drones += 1
+                drone = unnamed_drone_iri(drones)
+            crashes += 1
+            batch.extend(crash_triples(row, drone, crash_iri(crashes)))
+            written += 1
+            if written % batch_size == 0:
+                writer.write(batch, crashes=crashes, drones=drones)
+                batch = []
+        if batch:
+            writer.write(batch, crashes=crashes, drones=drones)
+        return written, writer.revision
+    finally:
+        writer.close()
+
+
+def read_csv(file, columns):
+    """Yield ``{field: value}`` dicts from a CSV file using ``columns`` (field -> header)."""
+    reader = csv.DictReader(file)
+    headers = {header.strip().lower(): header for header in reader.fieldnames or ()}
+    mapping = {}
+    for field in FIELDS:
+        header = columns.get(field, field)
+        if header.lower() in headers:
+            mapping[field] = headers[header.lower()]
+        elif field in columns:
+            raise SystemExit(f"{file.name}: no column {header!r} for {field}")
+    for record in reader:
+        yield {field: record[header] for field, header in mapping.items()}
+
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("store", help="SQLite triple store to create or append to")
+    parser.add_argument("csv", nargs="+", help="crash CSV files; '-' reads standard input")
+    parser.add_argument("--batch-size", type=positive_int, default=BATCH_SIZE, help="rows per committed batch")
+    parser.add_argument(
+        "--column", action="append", default=[], metavar="FIELD=HEADER",
+        help=f"read FIELD from column HEADER (fields: {', '.join(FIELDS)}); "
+             "by default each field is read from the column of the same name",
+    )
+    args = parser.parse_args(argv)
+
+    columns = {}
+    for option in args.column:
+        field, _, header = option.partition("=")
+        if field not in FIELDS or not header:
+            parser.error(f"--column expects FIELD=HEADER with FIELD one of {', '.join(FIELDS)}")
+        columns[field] = header
+
+    for name in args.csv:
+        file = sys.stdin if name == "-" else open(name, newline="", encoding="utf-8")
+        with file:
+            written, revision = ingest(args.store, read_csv(file, columns), args.batch_size)
+        print(f"{name}: {written} crashes, store at revision {revision}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stages a request's time is broken into, in Server-Timing order:
+# loading the dataset, producing query rows, turning them into response
+# rows, and encoding JSON
+STAGES = ("fetch", "query", "rows", "serialize")
+
+
+@contextmanager
+def stage(name):
+    """Count the time spent in the block towards stage ``name`` of the current request.
+
+    Stages nest: time spent in an inner stage is taken out of the enclosing
+    one, so the stages of a request add up to at most its total. Outside a
+    request this does nothing.
+    """
+    if not has_request_context() or "timings" not in g:
+        yield
+        return
+    stack = g.stage_stack
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        inner = stack.pop()
+        g.timings[name] += elapsed - inner
+        if stack:
+            stack[-1] += elapsed
+
+
+def add(name, seconds):
+    """Count ``seconds`` measured elsewhere towards stage ``name`` of the current request."""
+    if not has_request_context() or "timings" not in g:
+        return
+    g.timings[name] += seconds
+    if g.stage_stack:
+        g.stage_stack[-1] += seconds
+
+
+def adder(name):
+    """Return a function counting seconds towards stage ``name`` of the current request.
+
+    Like ``add`` with the request looked up once, for loops that count many
+    small amounts. Outside a request this returns None.
+    """
+    if not has_request_context() or "timings" not in g:
+        return None
+    timings, stack = g.timings, g.stage_stack
+
+    def add_seconds(seconds):
+        timings[name] += seconds
+        if stack:
+            stack[-1] += seconds
+    return add_seconds
+
+
+def max_rss_kb():
+    """Peak resident set size of this process in KiB, or None where it cannot be read."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with ``jsonify`` counted as the "serialize" stage.
+
+    Only whole responses are timed here; code that calls ``dumps`` once per
+    row times its own batches, since a stage per row would cost more than
+    the encoding it measures.
+    """
+
+    def response(self, *args, **kwargs):
+        with stage("serialize"):
+            return super().response(*args, **kwargs)
+
+
+class Metrics:
+    """Per-endpoint latency and stage totals, fed by ``instrument``'s request hooks.
+
+    The last ``samples`` latencies of each endpoint are kept for
+    percentiles; stage times are kept as running totals.
+    """
+
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, total, timings):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    "requests": 0,
+                    "latencies": deque(maxlen=self.samples),
+                    "stages": defaultdict(float),
+                }
+            stats["requests"] += 1
+            stats["latencies"].append(total)
+            for name, seconds in timings.items():
+                stats["stages"][name] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                latencies = sorted(stats["latencies"])
+                endpoints[endpoint] = {
+                    "requests": stats["requests"],
+                    "mean_ms": sum(latencies) / len(latencies) * 1000,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p90_ms": percentile(latencies, 90) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "max_ms": latencies[-1] * 1000,
+                    "mean_stage_ms": {
+                        name: stats["stages"][name] / stats["requests"] * 1000 for name in STAGES
+                    },
+                }
+            return {"max_rss_kb": max_rss_kb(), "endpoints": endpoints}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile ``p`` of the sorted sequence ``ordered``."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def instrument(app, metrics):
+    """Time every request of ``app`` by stage and record it in ``metrics``.
+
+    Each response gets a ``Server-Timing`` header with the stages measured
+    before it was returned. A streamed body is produced after that, so its
+    header only covers the work done up front; ``metrics`` gets the full
+    timings once the response is closed.
+    """
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timing():
+        g.timings = dict.fromkeys(STAGES, 0.0)
+        g.stage_stack = []
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        if "timings" not in g:
+            return response
+        timings = g.timings
+        start = g.request_start
+        total = time.perf_counter() - start
+        response.headers["Server-Timing"] = ", ".join(
+            [f"{name};dur={timings[name] * 1000:.3f}" for name in STAGES] + [f"total;dur={total * 1000:.3f}"]
+        )
+        endpoint = request.endpoint or request.path
+        response.call_on_close(lambda: metrics.record(endpoint, time.perf_counter() - start, timings))
+        return response
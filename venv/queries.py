@@ -0,0 +1,142 @@
+import re
+import threading
+import time
+
+from rdflib import Literal, Namespace, RDF, RDFS
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.term import Identifier
+
+import instrumentation
+
+# The opening brace of a query's WHERE clause ("WHERE" itself is optional)
+GROUP_START = re.compile(r"(?:\bWHERE\b)?\s*\{", re.IGNORECASE)
+
+ONTO = Namespace("http://ubt/crashedDrones#")
+
+NAMESPACES = {"rdf": RDF, "rdfs": RDFS, "onto": ONTO}
+
+
+class QueryRegistry:
+    """Named SPARQL queries, parsed and translated to algebra once.
+
+    Endpoint parameters are never spliced into the query text; they are
+    passed as ``initBindings`` when the prepared query is evaluated. Parse
+    time is recorded when a query is registered and evaluation time on every
+    call, so the two can be told apart in ``stats()``.
+    """
+
+    def __init__(self, namespaces=NAMESPACES):
+        self.namespaces = dict(namespaces)
+        self._queries = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, text):
+        start = time.perf_counter()
+        prepared = prepareQuery(text, initNs=self.namespaces)
+        compile_ms = (time.perf_counter() - start) * 1000
+        self._queries[name] = (text, prepared)
+        self._stats[name] = {"compile_ms": compile_ms, "calls": 0, "eval_ms": 0.0}
+        return name
+
+    def __contains__(self, name):
+        return name in self._queries
+
+    def text(self, name):
+        return self._queries[name][0]
+
+    def query(self, name, graph, **bindings):
+        """Evaluate query ``name`` against ``graph`` with the given variable bindings.
+
+        Plain strings are bound as untyped literals; rdflib terms are bound
+        as they are.
+        """
+        prepared = self._queries[name][1]
+        init_bindings = {
+            var: value if isinstance(value, Identifier) else Literal(value)
+            for var, value in bindings.items()
+        }
+        start = time.perf_counter()
+        results = graph.query(prepared, initBindings=init_bindings)
+        return TimedResult(results, time.perf_counter() - start, lambda seconds: self.record(name, seconds))
+
+    def remote_text(self, name, **bindings):
+        """Return query ``name`` as standalone SPARQL text for another endpoint.
+
+        The registry's prefixes are declared up front and the bindings are
+        written as an inline ``VALUES`` block at the start of the outermost
+        group, which is where ``initBindings`` take effect locally too.
+        Values are serialized with ``n3()``, so they are always quoted terms.
+        """
+        text = self._queries[name][0]
+        prologue = "".join(f"PREFIX {prefix}: <{uri}>\n" for prefix, uri in self.namespaces.items())
+        if not bindings:
+            return prologue + text
+        terms = {var: value if isinstance(value, Identifier) else Literal(value) for var, value in bindings.items()}
+        values = "VALUES ({}) {{ ({}) }}".format(
+            " ".join(f"?{var}" for var in terms), " ".join(term.n3() for term in terms.values())
+        )
+        match = GROUP_START.search(text)
+        return prologue + text[:match.end()] + "\n    " + values + text[match.end():]
+
+    def record(self, name, seconds):
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["eval_ms"] += seconds * 1000
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: dict(
+                    stats,
+                    mean_eval_ms=stats["eval_ms"] / stats["calls"] if stats["calls"] else None,
+                )
+                for name, stats in self._stats.items()
+            }
+
+
+class TimedResult:
+    """Wraps a query result and reports the time spent producing its rows.
+
+    rdflib evaluates SELECT queries lazily, so most of the work happens while
+    the rows are iterated. Only the time spent inside the result iterator is
+    counted, not the caller's own per-row work; ``on_done`` gets the total
+    in seconds once iteration stops.
+
+    The time also goes to the request's ``stage``: the setup time when the
+    result is made and each row's time as it is produced, so both are taken
+    out of whichever stage is open at that moment and no stage is credited
+    with time spent outside it. Wrappers of an already timed result pass
+    ``stage=None``.
+    """
+
+    def __init__(self, result, setup_seconds, on_done, stage="query"):
+        self.result = result
+        self.vars = result.vars
+        self._on_done = on_done
+        self._seconds = setup_seconds
+        self._stage = stage
+        if stage is not None:
+            instrumentation.add(stage, setup_seconds)
+
+    def __iter__(self):
+        rows = iter(self.result)
+        count = instrumentation.adder(self._stage) if self._stage is not None else None
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    self._count(count, time.perf_counter() - start)
+                    return
+                self._count(count, time.perf_counter() - start)
+                yield row
+        finally:
+            self._on_done(self._seconds)
+
+    def _count(self, count, seconds):
+        self._seconds += seconds
+        if count is not None:
+            count(seconds)
@@ -0,0 +1,187 @@
+import functools
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, request
+
+# A cached response body; revision is the dataset revision it was computed from
+Entry = namedtuple("Entry", ["body", "status", "mimetype", "revision", "expires"])
+
+
+class _Pending:
+    """A computation in flight that identical requests wait on instead of repeating."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+class ResultCache:
+    """Response cache keyed by (endpoint, normalized parameters, dataset revision).
+
+    Entries are kept in LRU order and evicted once there are more than
+    ``max_entries`` of them or their bodies add up to more than
+    ``max_bytes``; each one also expires ``ttl`` seconds after it was
+    stored. The revision is part of the key, so a response is never served
+    for a dataset other than the one it was computed from, and ``on_swap``
+    drops every entry of the previous revision as soon as the graph cache
+    moves on.
+
+    Concurrent misses on one key are coalesced: the first request computes
+    the response while the others wait for it and are counted as ``waits``.
+
+    ``revision`` is a callable returning the current dataset revision, or
+    None when there is no local revision to key on; requests then bypass the
+    cache.
+    """
+
+    def __init__(self, revision, max_entries=1024, max_bytes=32 << 20, ttl=300):
+        self.revision = revision
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+        self._current = None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ["hits", "misses", "waits", "bypassed", "evictions", "expirations", "invalidations", "uncacheable"], 0
+        )
+
+    def cached(self, args=(), **normalizers):
+        """Decorate a view so its responses are cached.
+
+        ``normalizers`` maps view arguments to functions that bring
+        equivalent values to one form, the way the view itself does, so
+        ``/x/fog`` and ``/x/Fog`` share an entry. ``args`` names the query
+        string arguments the view reads; the others are left out of the key,
+        so ``?_=123`` cache busters and the like share the entry too.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                revision = self.revision()
+                if revision is None:
+                    with self._lock:
+                        self._stats["bypassed"] += 1
+                    return view(**kwargs)
+                params = tuple(sorted(
+                    (name, normalizers.get(name, _same)(value)) for name, value in kwargs.items()
+                ))
+                query = tuple((name, tuple(request.args.getlist(name))) for name in args)
+                key = (request.endpoint, params, query, revision)
+                entry = self.get_or_compute(key, revision, lambda: _entry(view(**kwargs), revision))
+                if isinstance(entry, Entry):
+                    return current_app.response_class(entry.body, status=entry.status, mimetype=entry.mimetype)
+                return entry
+            return wrapper
+        return decorator
+
+    def get_or_compute(self, key, revision, compute):
+        """Return the entry for ``key``, computing it with ``compute`` on a miss.
+
+        ``compute`` may return something other than an ``Entry`` (such as an
+        error response); it is passed through without being cached.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._stats["hits"] += 1
+                return entry
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+                self._stats["misses"] += 1
+            else:
+                self._stats["waits"] += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.entry is not None:
+                return pending.entry
+            # The first request failed or was not cacheable; compute our own
+            return compute()
+
+        result = None
+        try:
+            result = compute()
+            return result
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if isinstance(result, Entry):
+                    pending.entry = result
+                    self._store(key, result)
+                else:
+                    self._stats["uncacheable"] += 1
+            pending.done.set()
+
+    def on_swap(self, old, new, added, removed):
+        """``GraphCache`` subscriber: forget every response of an older revision."""
+        with self._lock:
+            self._current = new.revision
+            for key in [key for key, entry in self._entries.items() if entry.revision != new.revision]:
+                self._remove(key)
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["waits"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                ttl=self.ttl,
+                hit_ratio=(self._stats["hits"] + self._stats["waits"]) / lookups if lookups else None,
+            )
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self._remove(key)
+            self._stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, entry):
+        size = len(entry.body)
+        if size > self.max_bytes or (self._current is not None and entry.revision != self._current):
+            # Too large to ever fit, or computed just before the revision moved on
+            self._stats["uncacheable"] += 1
+            return
+        entry = entry._replace(expires=time.monotonic() + self.ttl)
+        self._entries[key] = entry
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+
+def _entry(response, revision):
+    # Views may return anything Flask accepts, such as a (body, status) tuple
+    response = current_app.make_response(response)
+    # Only complete, successful, non-streamed responses are worth replaying
+    if response.status_code != 200 or response.is_streamed:
+        return response
+    return Entry(response.get_data(), response.status_code, response.mimetype, revision, None)
+
+
+def _same(value):
+    return value
@@ -0,0 +1,237 @@
+import re
+import threading
+from array import array
+from collections import defaultdict, namedtuple
+
+from rdflib import Graph, Literal, RDF, URIRef, Variable
+from rdflib.graph import ReadOnlyGraphAggregate
+
+from queries import ONTO
+from triple_store import TermIds, decode_terms, pack_state, unpack_state
+
+Rule = namedtuple("Rule", ["body", "head"])
+
+ATOM = re.compile(r"\s*(\w+)\s*\(([^()]*)\)\s*")
+# One argument and what follows it: a comma or the end of the list
+ARGUMENT = re.compile(r'\s*(\?\w+|"[^"]*"|<[^>]*>|\w+)\s*(,|\Z)')
+
+
+def parse_rule(text, namespace=ONTO):
+    """Parse a Horn rule such as ``Drone(?d) ^ weather(?d, "Fog") -> hasRisk(?d, "High")``.
+
+    A one-argument atom is a class membership (``?d rdf:type ns:Drone``),
+    a two-argument atom a property (``?d ns:weather "Fog"``). Arguments are
+    ``?variables``, ``"plain literals"``, ``<full IRIs>`` or names in
+    ``namespace``. The head is a conjunction like the body.
+    """
+    body, arrow, head = text.partition("->")
+    if not arrow:
+        raise ValueError(f"Rule has no '->': {text!r}")
+    rule = Rule(
+        body=[_parse_atom(atom, namespace) for atom in body.split("^")],
+        head=[_parse_atom(atom, namespace) for atom in head.split("^")],
+    )
+    body_variables = {term for atom in rule.body for term in atom if isinstance(term, Variable)}
+    unbound = {term for atom in rule.head for term in atom if isinstance(term, Variable)} - body_variables
+    if unbound:
+        raise ValueError(f"Head variables {sorted(unbound)} do not appear in the body of {text!r}")
+    return rule
+
+
+def _parse_atom(text, namespace):
+    match = ATOM.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Cannot parse rule atom {text.strip()!r}")
+    name, arguments = match.groups()
+    terms = [_parse_term(argument, namespace) for argument in _arguments(arguments, text)]
+    if len(terms) == 1:
+        return (terms[0], RDF.type, namespace[name])
+    if len(terms) == 2:
+        return (terms[0], namespace[name], terms[1])
+    raise ValueError(f"Rule atom {text.strip()!r} must have one or two arguments")
+
+
+def _arguments(text, atom):
+    # The arguments must make up the whole list, so "Heavy Rain" or "??x" is
+    # an error rather than a shorter argument
+    arguments = []
+    position = 0
+    while True:
+        match = ARGUMENT.match(text, position)
+        if match is None:
+            raise ValueError(f"Cannot parse the arguments of rule atom {atom.strip()!r}")
+        arguments.append(match.group(1))
+        position = match.end()
+        if not match.group(2):
+            return arguments
+
+
+def _parse_term(text, namespace):
+    if text.startswith("?"):
+        return Variable(text[1:])
+    if text.startswith('"'):
+        return Literal(text[1:-1])
+    if text.startswith("<"):
+        return URIRef(text[1:-1])
+    return namespace[text]
+
+
+class RuleEngine:
+    """Forward-chains Horn rules over an rdflib graph into an overlay graph.
+
+    ``materialize`` evaluates every rule once against the whole graph and
+    then iterates semi-naively: each later round only joins the facts
+    derived in the previous round, taking one body atom from that delta and
+    looking the others up through the graph's own triple indexes. The
+    derived triples live in ``self.inferred`` and never touch the source
+    graph. ``add`` runs the same loop seeded with newly added triples, so
+    new crash events only cost the derivations they enable.
+
+    Published overlays are never modified. ``add`` derives into a new layer
+    and publishes the union of the earlier layers and that one; a layer is
+    merged with the one before it once it is at least half that size, so
+    each inference is copied a logarithmic number of times and the union
+    stays a handful of graphs.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.inferred = Graph()
+        self.revision = None
+        self._layers = [self.inferred]
+        self._lock = threading.Lock()
+
+    def materialize(self, graph, revision=None):
+        with self._lock:
+            inferred = Graph()
+            delta = set()
+            for rule in self.rules:
+                for bindings in self._join(graph, inferred, rule.body, {}):
+                    delta.update(self._new_heads(graph, inferred, rule, bindings))
+            self._saturate(graph, inferred, inferred, delta)
+            self._publish([inferred], revision)
+
+    def add(self, graph, added, revision=None):
+        """Derive what follows from ``added``, triples that are already in ``graph``."""
+        with self._lock:
+            layer = Graph()
+            layers = self._layers + [layer]
+            self._saturate(graph, ReadOnlyGraphAggregate(layers), layer, set(added), seed=True)
+            if not len(layer):
+                self.revision = revision
+                return
+            while len(layers) > 1 and 2 * len(layers[-1]) >= len(layers[-2]):
+                merged = Graph()
+                merged += layers[-2]
+                merged += layers[-1]
+                layers[-2:] = [merged]
+            self._publish(layers, revision)
+
+    def _publish(self, layers, revision):
+        self._layers = layers
+        self.inferred = layers[0] if len(layers) == 1 else ReadOnlyGraphAggregate(layers)
+        self.revision = revision
+
+    def dump(self):
+        """Return the rules and what they inferred as bytes for ``restore``."""
+        ids = TermIds()
+        triples = array("q", (ids[term] for triple in self.inferred for term in triple))
+        return pack_state({"rules": _rule_texts(self.rules), "terms": ids.rows}, [triples])
+
+    def restore(self, data, revision):
+        """Load inferences ``dump`` made at ``revision``; False if they came from other rules."""
+        state = unpack_state(data)
+        if state is None or state[0].get("rules") != _rule_texts(self.rules):
+            return False
+        (header, (ids,)) = state
+        terms = decode_terms(header["terms"])
+        inferred = Graph()
+        for i in range(0, len(ids), 3):
+            inferred.add((terms[ids[i]], terms[ids[i + 1]], terms[ids[i + 2]]))
+        with self._lock:
+            self._publish([inferred], revision)
+        return True
+
+    def on_swap(self, old, new, added, removed):
+        """``GraphCache`` subscriber; removals can retract inferences, so they force a rebuild."""
+        if self.revision == new.revision:
+            return
+        if old is None or self.revision != old.revision:
+            self.materialize(new.graph, new.revision)
+            return
+        if removed:
+            self.materialize(new.graph, new.revision)
+        else:
+            self.add(new.graph, added, new.revision)
+
+    def _saturate(self, graph, inferred, layer, delta, seed=False):
+        # With seed=False the delta has already been derived and still has
+        # to be stored in ``layer``, a graph ``inferred`` looks into; with
+        # seed=True it is base data that is only joined.
+        while delta:
+            if not seed:
+                for triple in delta:
+                    layer.add(triple)
+            seed = False
+            by_predicate = defaultdict(list)
+            for triple in delta:
+                by_predicate[triple[1]].append(triple)
+
+            derived = set()
+            for rule in self.rules:
+                for i, atom in enumerate(rule.body):
+                    rest = rule.body[:i] + rule.body[i + 1:]
+                    if isinstance(atom[1], Variable):
+                        candidates = delta
+                    else:
+                        candidates = by_predicate.get(atom[1], ())
+                    for triple in candidates:
+                        bindings = _match(atom, triple, {})
+                        if bindings is None:
+                            continue
+                        for full in self._join(graph, inferred, rest, bindings):
+                            derived.update(self._new_heads(graph, inferred, rule, full))
+            delta = derived
+
+    def _new_heads(self, graph, inferred, rule, bindings):
+        for atom in rule.head:
+            triple = tuple(bindings.get(term, term) if isinstance(term, Variable) else term for term in atom)
+            if triple not in graph and triple not in inferred:
+                yield triple
+
+    def _join(self, graph, inferred, atoms, bindings):
+        if not atoms:
+            yield bindings
+            return
+        # Look up the atom with the most bound positions first, and among
+        # those one that joins on an already bound variable
+        atom = max(atoms, key=lambda a: (
+            sum(not isinstance(t, Variable) or t in bindings for t in a),
+            sum(isinstance(t, Variable) and t in bindings for t in a),
+        ))
+        rest = [a for a in atoms if a is not atom]
+        pattern = tuple(
+            (bindings.get(term) if isinstance(term, Variable) else term) for term in atom
+        )
+        for source in (graph, inferred):
+            for triple in source.triples(pattern):
+                extended = _match(atom, triple, bindings)
+                if extended is not None:
+                    yield from self._join(graph, inferred, rest, extended)
+
+
+def _rule_texts(rules):
+    # Rules in a form that survives JSON, to tell whether saved inferences came from them
+    return [[[[term.n3() for term in atom] for atom in part] for part in rule] for rule in rules]
+
+
+def _match(atom, triple, bindings):
+    extended = dict(bindings)
+    for term, value in zip(atom, triple):
+        if isinstance(term, Variable):
+            bound = extended.setdefault(term, value)
+            if bound != value:
+                return None
+        elif term != value:
+            return None
+    return extended
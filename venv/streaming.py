@@ -0,0 +1,77 @@
+from itertools import islice
+
+from flask import Response, json, request, stream_with_context
+
+from instrumentation import stage
+
+# Rows serialized per chunk written to the socket
+CHUNK_ROWS = 500
+
+
+def result_rows(results, limit=None, key="drone"):
+    """Yield SELECT result rows as ``{variable: str or None}`` dicts.
+
+    With ``limit`` the rows stop once at least ``limit`` have been produced
+    and ``key`` changes value, so a page never ends halfway through one
+    drone's crashes and the last row's ``key`` is a safe ``after`` cursor.
+    """
+    names = [str(var) for var in results.vars]
+    key_index = names.index(key) if limit is not None else None
+    count = 0
+    last = None
+    for row in results:
+        if limit is not None:
+            if count >= limit and row[key_index] != last:
+                return
+            last = row[key_index]
+        count += 1
+        yield {name: str(val) if val else None for name, val in zip(names, row)}
+
+
+def wants_ndjson():
+    return request.args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best == "application/x-ndjson"
+    )
+
+
+def stream_response(rows, ndjson=None):
+    """Stream ``rows`` as one JSON array, or as NDJSON when the client asks for it.
+
+    Rows are encoded as they come off the result iterator, so the first
+    bytes go out before the query has produced its last row and the full
+    result is never held as a list. The request context is kept alive while
+    streaming so rows are encoded with the app's JSON settings, as
+    ``jsonify`` would.
+    """
+    if ndjson is None:
+        ndjson = wants_ndjson()
+    if ndjson:
+        return Response(stream_with_context(_ndjson_chunks(rows)), mimetype="application/x-ndjson")
+    return Response(stream_with_context(_array_chunks(rows)), mimetype="application/json")
+
+
+def _encoded_chunks(rows):
+    # Rows are produced and encoded a chunk at a time, and each step is
+    # timed once per chunk rather than once per row
+    rows = iter(rows)
+    while True:
+        with stage("rows"):
+            chunk = list(islice(rows, CHUNK_ROWS))
+        if not chunk:
+            return
+        with stage("serialize"):
+            encoded = [json.dumps(row) for row in chunk]
+        yield encoded
+
+
+def _ndjson_chunks(rows):
+    for chunk in _encoded_chunks(rows):
+        yield "\n".join(chunk) + "\n"
+
+
+def _array_chunks(rows):
+    separator = "["
+    for chunk in _encoded_chunks(rows):
+        yield separator + ",".join(chunk)
+        separator = ","
+    yield "]" if separator == "," else "[]"
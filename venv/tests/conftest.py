@@ -0,0 +1,164 @@
+import importlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from rdflib import Graph, Literal, RDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queries import ONTO  # noqa: E402
+
+# drone: (model, operator, [(crash, date, location, phase, weather), ...]);
+# None leaves the attribute out. The counts are chosen so every top-1 route has a single winner for the
+# parameters the tests use, which keeps LIMIT 1 answers comparable.
+DRONES = {
+    "drone1": ("Reaper", "Operator A", [
+        ("crash1", "2023-01-10", "Kyiv, Ukraine", "Landing", "Fog"),
+        ("crash2", "2023-02-11", "Kyiv, Ukraine", "Cruise", "Clear"),
+    ]),
+    "drone2": ("Reaper", "Operator A", [
+        ("crash3", "2023-01-10", "Gaza, Palestine", "Landing", "Fog"),
+    ]),
+    "drone3": ("Orion", "Operator B", [
+        ("crash4", "2023-03-12", "Kyiv, Ukraine", "Takeoff", "Heavy Rain/Snow"),
+        ("crash5", "2023-03-13", "Komotini, Greece", "Landing", "Fog"),
+    ]),
+    "drone4": ("Heron", "Operator C", [
+        ("crash6", "2023-04-01", "Kyiv, Ukraine", "Cruise", "Wind"),
+        ("crash10", "2023-04-02", "Gaza, Palestine", None, "Wind"),
+    ]),
+    "drone5": ("Orion", "Operator B", []),
+    "drone6": ("Reaper", "Operator D", [
+        ("crash7", "2023-05-05", "Kyiv, Ukraine", "Landing", "Heavy Rain/Snow"),
+    ]),
+    "drone8": ("Orion", "Operator E", [
+        ("crash11", None, "Komotini, Greece", "Takeoff", "Snow"),
+    ]),
+}
+
+
+def crash_graph():
+    """Return the fixture dataset as a fresh graph."""
+    g = Graph()
+    g.bind("onto", ONTO)
+    for name, (model, operator, crashes) in DRONES.items():
+        drone = ONTO[name]
+        g.add((drone, RDF.type, ONTO.Drone))
+        g.add((drone, ONTO.model, Literal(model)))
+        g.add((drone, ONTO.operator, Literal(operator)))
+        for crash, date, location, phase, weather in crashes:
+            event = ONTO[crash]
+            g.add((drone, ONTO.involvedInCrash, event))
+            g.add((event, RDF.type, ONTO.CrashEvent))
+            details = {ONTO.date: date, ONTO.location: location, ONTO.phase: phase, ONTO.weather: weather}
+            for predicate, value in details.items():
+                if value is not None:
+                    g.add((event, predicate, Literal(value)))
+
+    # Two weathers for one crash: it is a solution for either of them
+    g.add((ONTO.crash1, ONTO.weather, Literal("Wind")))
+
+    # A crash event no drone is linked to, and an untyped event of an untyped
+    # drone: the event-level count routes see them, the per-drone ones do not
+    g.add((ONTO.crash8, RDF.type, ONTO.CrashEvent))
+    g.add((ONTO.crash8, ONTO.location, Literal("Gaza, Palestine")))
+    g.add((ONTO.crash8, ONTO.phase, Literal("Cruise")))
+    g.add((ONTO.crash8, ONTO.weather, Literal("Fog")))
+    g.add((ONTO.drone7, ONTO.involvedInCrash, ONTO.crash9))
+    g.add((ONTO.crash9, ONTO.location, Literal("Komotini, Greece")))
+    g.add((ONTO.crash9, ONTO.phase, Literal("Takeoff")))
+    return g
+
+
+class Fuseki:
+    """A stand-in for the Fuseki dataset: graph store GET on /data, SPARQL on /query.
+
+    ``graph`` can be replaced or changed between requests; ``etag`` makes
+    /data send that validator and answer matching conditional GETs with 304.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.etag = None
+        self.requests = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}/droneCrashWeather"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fuseki = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                fuseki.requests.append(("GET", url.path))
+                if url.path.endswith("/data"):
+                    if fuseki.etag and self.headers.get("If-None-Match") == fuseki.etag:
+                        self._send(304, b"", None)
+                        return
+                    headers = {"ETag": fuseki.etag} if fuseki.etag else {}
+                    self._send(200, fuseki.graph.serialize(format="turtle").encode(), "text/turtle", headers)
+                elif url.path.endswith("/query"):
+                    self._query(parse_qs(url.query)["query"][0])
+                else:
+                    self._send(404, b"", None)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                fuseki.requests.append(("POST", url.path))
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                if url.path.endswith("/query"):
+                    self._query(parse_qs(body)["query"][0])
+                else:
+                    self._send(404, b"", None)
+
+            def _query(self, text):
+                result = fuseki.graph.query(text)
+                self._send(200, result.serialize(format="json"), "application/sparql-results+json")
+
+            def _send(self, status, body, content_type, headers=()):
+                self.send_response(status)
+                if content_type:
+                    self.send_header("Content-Type", content_type)
+                for name, value in dict(headers).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def fuseki():
+    server = Fuseki(crash_graph())
+    yield server
+    server.close()
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """The app, imported once against a stand-in serving the fixture dataset."""
+    server = Fuseki(crash_graph())
+    os.environ["CRASH_FUSEKI_URL"] = server.url
+    os.environ.pop("CRASH_STORE", None)
+    module = importlib.import_module("app")
+    module.graph_cache.stop()
+    yield module
+    server.close()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,161 @@
+import pytest
+from rdflib import Graph, Literal, RDF
+
+from aggregates import CountIndex, View, check_consistency
+from graph_cache import Snapshot, graph_delta
+from queries import ONTO, QueryRegistry
+from conftest import crash_graph
+
+VIEWS = {
+    "byModel": View(group_by=["model"]),
+    "modelByWeather": View(group_by=["model"], where=["weather"]),
+    "byWeather": View(group_by=["weather"], require=["location"]),
+    "eventsByPhase": View(group_by=["phase"], facts="event"),
+    "byLocation": View(group_by=["location"], facts="involvement"),
+    "subjectsByLocation": View(group_by=["location"], facts="subject"),
+}
+
+
+def snapshot(graph, revision):
+    return Snapshot(graph, revision, None, None, None, None, 0)
+
+
+def index_of(graph, revision=1):
+    index = CountIndex(VIEWS)
+    index.build(graph, revision)
+    return index
+
+
+def all_counts(index):
+    return {name: index._slices[name] for name in VIEWS}
+
+
+def test_views_count_the_facts_their_queries_match():
+    index = index_of(crash_graph())
+
+    assert index.counts("byModel") == {(Literal("Reaper"),): 4, (Literal("Orion"),): 3, (Literal("Heron"),): 2}
+    assert index.total("modelByWeather", weather="Fog") == 3
+    # crash1 has two weathers and counts under both
+    assert index.counts("modelByWeather", weather="Wind") == {(Literal("Reaper"),): 1, (Literal("Heron"),): 2}
+    # crash8 has no drone, crash9 an untyped drone and no rdf:type itself
+    assert index.counts("eventsByPhase")[(Literal("Cruise"),)] == 3
+    assert index.counts("eventsByPhase")[(Literal("Takeoff"),)] == 2
+    assert index.counts("byLocation")[(Literal("Komotini, Greece"),)] == 3
+    assert index.counts("subjectsByLocation")[(Literal("Gaza, Palestine"),)] == 3
+    assert index.top("subjectsByLocation") == [((Literal("Kyiv, Ukraine"),), 5)]
+
+
+def test_counts_agree_with_the_queries_they_materialize(app_module):
+    graph = crash_graph()
+    index = CountIndex(app_module.crash_counts.views)
+    index.build(graph)
+
+    mismatches = []
+    for view, query_name, limited, dimension in app_module.COUNT_INDEX_CHECKS:
+        slices = [{}]
+        if dimension is not None:
+            slices = [{dimension: value} for (value,) in index.counts(app_module.DIMENSION_VIEWS[dimension])]
+        for where in slices:
+            mismatches += check_consistency(index, graph, app_module.queries, view, query_name, limited, **where)
+    assert mismatches == []
+
+
+def test_check_consistency_reports_a_wrong_count():
+    graph = crash_graph()
+    index = index_of(graph)
+    registry = QueryRegistry()
+    registry.register("byPhase", """
+        SELECT ?phase (COUNT(?crashEvent) AS ?crashCount) WHERE {
+          ?crashEvent rdf:type onto:CrashEvent .
+          ?crashEvent onto:phase ?phase .
+        }
+        GROUP BY ?phase
+    """)
+    assert check_consistency(index, graph, registry, "eventsByPhase", "byPhase") == []
+
+    graph.add((ONTO.crash10, RDF.type, ONTO.CrashEvent))
+    graph.add((ONTO.crash10, ONTO.phase, Literal("Cruise")))
+    assert check_consistency(index, graph, registry, "eventsByPhase", "byPhase") == [
+        "eventsByPhase{} (rdflib.term.Literal('Cruise'),): 3 != 4"
+    ]
+
+
+def changed(graph):
+    graph = graph + Graph()
+    # A new crash for an existing drone
+    graph.add((ONTO.drone4, ONTO.involvedInCrash, ONTO.crash10))
+    graph.add((ONTO.crash10, RDF.type, ONTO.CrashEvent))
+    graph.add((ONTO.crash10, ONTO.weather, Literal("Fog")))
+    graph.add((ONTO.crash10, ONTO.location, Literal("Gaza, Palestine")))
+    graph.add((ONTO.crash10, ONTO.phase, Literal("Landing")))
+    # An event attribute changed, a drone attribute changed, a link dropped
+    graph.set((ONTO.crash1, ONTO.weather, Literal("Wind")))
+    graph.set((ONTO.drone3, ONTO.model, Literal("Heron")))
+    graph.remove((ONTO.drone2, ONTO.involvedInCrash, ONTO.crash3))
+    # The untyped drone becomes a Drone, the unlinked event loses its type
+    graph.add((ONTO.drone7, RDF.type, ONTO.Drone))
+    graph.add((ONTO.drone7, ONTO.model, Literal("Orion")))
+    graph.remove((ONTO.crash8, RDF.type, ONTO.CrashEvent))
+    return graph
+
+
+def test_incremental_update_matches_a_rebuild():
+    old = crash_graph()
+    new = changed(old)
+    index = index_of(old)
+
+    index.on_swap(snapshot(old, 1), snapshot(new, 2), *graph_delta(old, new))
+
+    assert index.revision == 2
+    assert all_counts(index) == all_counts(index_of(new))
+
+
+def test_incremental_update_refreshes_cached_tops():
+    old = crash_graph()
+    index = index_of(old)
+    assert index.top("byModel") == [((Literal("Reaper"),), 4)]
+
+    new = old + Graph()
+    for n in range(5):
+        crash = ONTO[f"extra{n}"]
+        new.add((ONTO.drone4, ONTO.involvedInCrash, crash))
+    index.on_swap(snapshot(old, 1), snapshot(new, 2), *graph_delta(old, new))
+
+    assert index.top("byModel") == [((Literal("Heron"),), 7)]
+
+
+def test_tops_are_only_cached_for_slices_the_data_has():
+    index = index_of(crash_graph())
+
+    for n in range(100):
+        assert index.top("modelByWeather", weather=f"x{n}") == []
+    assert index.top("modelByWeather", weather="Fog") == [((Literal("Reaper"),), 2)]
+
+    assert list(index._top) == [("modelByWeather", (Literal("Fog"),))]
+
+
+def test_readers_keep_the_old_counts_while_a_build_runs():
+    graph = crash_graph()
+    index = index_of(graph)
+    seen = []
+
+    class Watched(Graph):
+        def subject_objects(self, predicate=None, unique=False):
+            # Called by build before it swaps the new counts in
+            seen.append(index.total("byModel"))
+            return super().subject_objects(predicate, unique)
+
+    watched = Watched()
+    watched += graph
+    watched.remove((ONTO.drone1, ONTO.involvedInCrash, ONTO.crash1))
+    index.build(watched, 2)
+
+    assert set(seen) == {9}
+    assert index.total("byModel") == 8
+
+
+def test_event_views_only_take_event_dimensions():
+    with pytest.raises(ValueError):
+        View(group_by=["model"], facts="event")
+    with pytest.raises(ValueError):
+        View(group_by=["phase"], facts="drones")
@@ -0,0 +1,208 @@
+import json
+import time
+from itertools import product
+
+import pytest
+import requests
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.namespace import XSD
+
+from backends import AutoBackend, RemoteBackend, SPARQLJSONResult
+from queries import QueryRegistry
+
+# Endpoints that report on the app itself rather than on the dataset
+DIAGNOSTICS = {"queryStats", "metricsReport", "cacheStats", "queryBackend", "checkCountIndex"}
+
+# URL parameter values: one the fixture has, one it does not
+ARGUMENTS = {
+    "weather_condition": ["fog", "wind", "nonexistent"],
+    "phase": ["landing", "nowhere"],
+    "location": ["Kyiv, Ukraine", "nowhere"],
+    "model": ["reaper", "x"],
+}
+QUERY_STRINGS = {"filterDataByDate": ["?date=2023-01-10", "?date=nope"]}
+
+
+def route_urls(app):
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == "static" or rule.endpoint in DIAGNOSTICS:
+            continue
+        names = sorted(rule.arguments)
+        for values in product(*(ARGUMENTS[name] for name in names)):
+            url = rule.build(dict(zip(names, values)), append_unknown=False)[1]
+            for query in QUERY_STRINGS.get(rule.endpoint, [""]):
+                yield url + query
+
+
+def answer(client, url):
+    """Status, rows as a multiset and the order of drones of one response."""
+    response = client.get(url)
+    body = response.get_json()
+    if not isinstance(body, list):
+        return response.status_code, body, None
+    drones = [row["drone"] for row in body if isinstance(row, dict) and "drone" in row]
+    return response.status_code, sorted(json.dumps(row, sort_keys=True) for row in body), drones
+
+
+def test_remote_backend_answers_every_route_like_local(app_module, client, monkeypatch):
+    local = {url: answer(client, url) for url in route_urls(app_module.app)}
+    monkeypatch.setattr(app_module, "backend", RemoteBackend(app_module.queries, app_module.QUERY_URL))
+    remote = {url: answer(client, url) for url in route_urls(app_module.app)}
+
+    assert all(status == 200 for status, _, _ in local.values())
+    assert {url: result for url, result in remote.items() if result != local[url]} == {}
+
+
+def test_auto_backend_answers_every_route_like_local(app_module, client, monkeypatch):
+    local = {url: answer(client, url) for url in route_urls(app_module.app)}
+    remote = RemoteBackend(app_module.queries, app_module.QUERY_URL)
+    auto = AutoBackend(app_module.backend, remote, explore_every=2)
+    monkeypatch.setattr(app_module, "backend", auto)
+
+    # Twice, so every query gets answered by both backends
+    for _ in range(2):
+        app_module.response_cache.clear()
+        answers = {url: answer(client, url) for url in route_urls(app_module.app)}
+        assert {url: result for url, result in answers.items() if result != local[url]} == {}
+    app_module.response_cache.clear()
+
+    costs = auto.costs()
+    for name in ("countAllCrashedByPhase", "modelAndLocation", "getAllData", "filterData"):
+        assert set(costs[name]) == {"local", "remote"}
+
+
+class ChunkedResponse:
+    """Just enough of ``requests.Response`` for ``SPARQLJSONResult``."""
+
+    def __init__(self, text, chunk_size=7):
+        self.encoding = "utf-8"
+        self.closed = False
+        data = text.encode()
+        self._chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    def iter_content(self, chunk_size):
+        return iter(self._chunks)
+
+    def close(self):
+        self.closed = True
+
+
+BINDINGS = [
+    {"s": {"type": "uri", "value": "http://ubt/crashedDrones#drone1"},
+     "o": {"type": "literal", "value": "Kyiv, Ukraine"}},
+    {"s": {"type": "bnode", "value": "b0"},
+     "o": {"type": "literal", "value": "3", "datatype": str(XSD.integer)}},
+    {"s": {"type": "uri", "value": "http://ubt/crashedDrones#drone2"},
+     "o": {"type": "literal", "value": "Nebel", "xml:lang": "de"}},
+    {"s": {"type": "uri", "value": "http://ubt/crashedDrones#drone3"}},
+]
+EXPECTED = [
+    (URIRef("http://ubt/crashedDrones#drone1"), Literal("Kyiv, Ukraine")),
+    (BNode("b0"), Literal("3", datatype=XSD.integer)),
+    (URIRef("http://ubt/crashedDrones#drone2"), Literal("Nebel", lang="de")),
+    (URIRef("http://ubt/crashedDrones#drone3"), None),
+]
+
+
+@pytest.mark.parametrize("document", [
+    {"head": {"vars": ["s", "o"]}, "results": {"bindings": BINDINGS}},
+    {"results": {"bindings": BINDINGS}, "head": {"vars": ["s", "o"]}},
+], ids=["head first", "results first"])
+def test_sparql_json_result_decodes_rows_across_chunks(document):
+    response = ChunkedResponse(json.dumps(document))
+    result = SPARQLJSONResult(response)
+
+    assert result.vars == [Variable("s"), Variable("o")]
+    assert [tuple(row) for row in result] == EXPECTED
+    assert response.closed
+
+
+def test_sparql_json_result_without_head_is_rejected():
+    with pytest.raises(ValueError):
+        SPARQLJSONResult(ChunkedResponse('{"results": {"bindings": []}}'))
+
+
+def test_remote_backend_binds_parameters_in_the_query(fuseki):
+    registry = QueryRegistry()
+    registry.register("weatherOf", "SELECT ?crash WHERE { ?crash onto:weather ?weather }")
+    backend = RemoteBackend(registry, fuseki.url + "/query")
+
+    crashes = sorted(str(row[0]) for row in backend.select("weatherOf", weather="Fog"))
+
+    assert crashes == [str(URIRef(f"http://ubt/crashedDrones#crash{n}")) for n in (1, 3, 5, 8)]
+    assert registry.stats()["weatherOf"]["calls"] == 1
+
+
+def test_remote_backend_raises_on_http_errors(fuseki):
+    registry = QueryRegistry()
+    registry.register("all", "SELECT * WHERE { ?s ?p ?o }")
+    backend = RemoteBackend(registry, fuseki.url + "/missing")
+
+    with pytest.raises(requests.HTTPError):
+        backend.select("all")
+
+
+class FailingSession:
+    def __init__(self, response):
+        self.response = response
+
+    def post(self, url, **kwargs):
+        return self.response
+
+
+class ErrorResponse(ChunkedResponse):
+    def raise_for_status(self):
+        raise requests.HTTPError("503 Server Error")
+
+
+class MalformedResponse(ChunkedResponse):
+    def raise_for_status(self):
+        pass
+
+
+@pytest.mark.parametrize("response, error", [
+    (ErrorResponse("Service unavailable"), requests.HTTPError),
+    (MalformedResponse('{"results": {"bindings": []}}'), ValueError),
+], ids=["http error", "no head"])
+def test_remote_backend_closes_responses_it_cannot_read(response, error):
+    registry = QueryRegistry()
+    registry.register("all", "SELECT * WHERE { ?s ?p ?o }")
+    backend = RemoteBackend(registry, "http://fuseki/query", session=FailingSession(response))
+
+    with pytest.raises(error):
+        backend.select("all")
+    assert response.closed
+
+
+class FixedCostBackend:
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.calls = 0
+
+    def select(self, name, **bindings):
+        self.calls += 1
+        backend = self
+
+        class Result:
+            vars = []
+
+            def __iter__(self):
+                # Stands in for the time spent producing rows
+                time.sleep(backend.seconds)
+                yield from ()
+
+        return Result()
+
+
+def test_auto_backend_measures_both_then_prefers_the_cheaper_one():
+    cheap = FixedCostBackend("local", 0)
+    costly = FixedCostBackend("remote", 0.05)
+    backend = AutoBackend(cheap, costly, explore_every=5)
+
+    for _ in range(10):
+        list(backend.select("q"))
+
+    assert costly.calls == 3  # the first measurement, then every 5th call
+    assert cheap.calls == 7
+    assert set(backend.costs()["q"]) == {"local", "remote"}
@@ -0,0 +1,105 @@
+import pytest
+from rdflib import Literal
+
+import columnar
+from aggregates import CountIndex
+from columnar import CrashTable, _distinct_rows
+from queries import QueryRegistry
+from conftest import crash_graph
+
+COUNT_BY = """
+    SELECT {by} (COUNT(?crashEvent) AS ?crashCount) WHERE {{
+        ?drone a onto:Drone ; onto:involvedInCrash ?crashEvent .
+        {pattern}
+    }} GROUP BY {by}
+"""
+PATTERNS = {
+    "model": "?drone onto:model ?model .",
+    "operator": "?drone onto:operator ?operator .",
+    "location": "?crashEvent onto:location ?location .",
+    "phase": "?crashEvent onto:phase ?phase .",
+    "weather": "?crashEvent onto:weather ?weather .",
+}
+
+
+@pytest.fixture(params=["numpy", "python"])
+def table(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(columnar, "numpy", None)
+    elif columnar.numpy is None:
+        pytest.skip("NumPy is not installed")
+    table = CrashTable()
+    table.load(crash_graph())
+    return table
+
+
+def test_group_counts_match_the_count_index(app_module, table):
+    views = {name: view for name, view in app_module.crash_counts.views.items() if view.facts == "crash"}
+    index = CountIndex(views)
+    index.build(crash_graph())
+
+    for name, view in views.items():
+        slices = [{}]
+        for dimension in view.where:
+            slices = [dict(where, **{dimension: value}) for where in slices for value in table._data[dimension].values]
+        for where in slices + [{dimension: "nowhere" for dimension in view.where}]:
+            counts = table.group_count(view.group_by, view.require, **where)
+            expected = index.counts(name, **where)
+            assert counts == expected, (name, where)
+            if expected:
+                assert [count for _, count in table.top(view.group_by, 1, view.require, **where)] == [
+                    count for _, count in index.top(name, 1, **where)
+                ]
+
+
+@pytest.mark.parametrize("by, where", [
+    (["model"], {}),
+    (["model", "operator"], {}),
+    (["weather"], {}),
+    (["location"], {"weather": "Fog"}),
+    (["phase"], {"weather": "Wind"}),
+    (["model"], {"location": "Gaza, Palestine"}),
+])
+def test_group_counts_match_sparql(table, by, where):
+    registry = QueryRegistry()
+    pattern = " ".join(PATTERNS[column] for column in dict.fromkeys([*by, *where]))
+    registry.register("q", COUNT_BY.format(by=" ".join(f"?{column}" for column in by), pattern=pattern))
+
+    expected = {
+        tuple(row[column] for column in by): int(row["crashCount"])
+        for row in registry.query("q", crash_graph(), **where)
+    }
+
+    assert table.group_count(by, **where) == expected
+
+
+def test_a_crash_with_two_weathers_counts_once_per_model(table):
+    # crash1 has rows for Fog and Wind; both are one crash of a Reaper
+    assert table.group_count(["model"])[(Literal("Reaper"),)] == 4
+    assert table.group_count(["weather"], model="Reaper") == {
+        (Literal("Fog"),): 2, (Literal("Wind"),): 1, (Literal("Clear"),): 1, (Literal("Heavy Rain/Snow"),): 1,
+    }
+    assert table.group_count([]) == {(): 9}
+
+
+@pytest.mark.parametrize("after, where", [
+    (None, {}),
+    (None, {"weather": "Fog"}),
+    ("http://ubt/crashedDrones#drone2", {"phase": "Landing"}),
+])
+def test_select_reads_the_same_rows_a_chunk_at_a_time(table, monkeypatch, after, where):
+    columns = ["drone", "model", "crash", "weather"]
+    select = lambda: [tuple(row) for row in table.select(columns, after, ["crash"], **where)]
+    whole = select()
+    monkeypatch.setattr(columnar, "FILTER_CHUNK", 2)
+
+    assert select() == whole
+    assert whole
+
+
+def test_distinct_rows_are_the_same_when_keys_would_not_fit_in_64_bits():
+    numpy = pytest.importorskip("numpy")
+    codes = [numpy.array([1, 1, 2, 1], dtype=numpy.int32), numpy.array([3, 3, 3, 4], dtype=numpy.int32)]
+
+    assert sorted(_distinct_rows(codes, [3, 5]).tolist()) == [0, 2, 3]
+    assert sorted(_distinct_rows(codes, [1 << 40, 1 << 40]).tolist()) == [0, 2, 3]
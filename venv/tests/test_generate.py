@@ -0,0 +1,56 @@
+from collections import Counter
+
+import pytest
+
+from bench import DIAGNOSTICS, main, routes
+from generate import MODELS, PHASES, WEATHER, crash_rows
+from ingest import FIELDS
+
+
+def test_rows_are_the_same_for_a_seed_and_differ_across_seeds():
+    assert list(crash_rows(500, seed=1)) == list(crash_rows(500, seed=1))
+    assert list(crash_rows(500, seed=1)) != list(crash_rows(500, seed=2))
+
+
+def test_the_requested_number_of_complete_rows_is_generated():
+    # More than one internal batch of draws
+    rows = list(crash_rows(25_001))
+
+    assert len(rows) == 25_001
+    assert all(set(row) == set(FIELDS) and all(row.values()) for row in rows)
+
+
+def test_a_drone_keeps_its_model_and_operator():
+    attributes = {}
+    for row in crash_rows(5_000, seed=3):
+        assert attributes.setdefault(row["drone"], (row["model"], row["operator"])) == (row["model"], row["operator"])
+
+
+def test_crashes_are_skewed():
+    rows = list(crash_rows(20_000, seed=4))
+    models = Counter(row["model"] for row in rows)
+    drones = Counter(row["drone"] for row in rows)
+    weather = Counter(row["weather"] for row in rows)
+
+    # The most crash-prone model has several times the average share
+    assert models.most_common(1)[0][1] > 3 * len(rows) / len(MODELS)
+    # Some drones crash again and again, while most drones crash only a few times
+    assert drones.most_common(1)[0][1] > 10 * len(rows) / len(drones)
+    assert max(weather, key=weather.get) == max(WEATHER, key=WEATHER.get)
+    assert set(row["phase"] for row in rows) == set(PHASES)
+
+
+def test_bench_routes_leave_diagnostics_out_unless_asked(app_module):
+    benched = dict(routes(app_module.app, {}))
+    with_diagnostics = dict(routes(app_module.app, {}, diagnostics=True))
+
+    assert not DIAGNOSTICS & set(benched)
+    assert set(with_diagnostics) - set(benched) == DIAGNOSTICS
+    assert "/countModelBySpecificWeatherCondition/fog" in benched.values()
+
+
+def test_bench_refuses_a_store_that_does_not_exist(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(["--store", str(tmp_path / "missing.db")])
+
+    assert "no such triple store" in capsys.readouterr().err
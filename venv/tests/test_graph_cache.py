@@ -0,0 +1,110 @@
+from rdflib import Literal
+
+import graph_cache
+from graph_cache import GraphCache
+from queries import ONTO
+
+
+def cache_for(fuseki, **kwargs):
+    return GraphCache(fuseki.url + "/data", fuseki.url + "/query", interval=0, **kwargs)
+
+
+def test_snapshot_is_loaded_once_and_shared(fuseki):
+    cache = cache_for(fuseki)
+
+    first = cache.snapshot
+    assert cache.snapshot is first
+    assert len(first.graph) == len(fuseki.graph)
+    assert [path for _, path in fuseki.requests if path.endswith("/data")] == ["/droneCrashWeather/data"]
+
+
+def test_unchanged_dataset_keeps_the_snapshot(fuseki):
+    cache = cache_for(fuseki)
+    snapshot = cache.snapshot
+
+    assert cache.refresh() is False
+    assert cache.snapshot.graph is snapshot.graph
+    assert cache.revision == 1
+
+
+def test_added_triple_is_picked_up_by_the_count_probe(fuseki):
+    cache = cache_for(fuseki)
+    cache.snapshot
+    fuseki.graph.add((ONTO.crash1, ONTO.weather, Literal("Clear")))
+
+    assert cache.refresh() is True
+    assert cache.revision == 2
+    assert (ONTO.crash1, ONTO.weather, Literal("Clear")) in cache.graph
+
+
+def test_update_keeping_the_triple_count_is_picked_up_once_the_snapshot_is_old(fuseki):
+    cache = cache_for(fuseki, max_age=3600)
+    cache.snapshot
+    fuseki.graph.set((ONTO.crash2, ONTO.weather, Literal("Wind")))
+
+    # Same number of triples, so the probe alone cannot tell
+    assert cache.refresh() is False
+
+    cache.max_age = 0
+    assert cache.refresh() is True
+    assert cache.graph.value(ONTO.crash2, ONTO.weather) == Literal("Wind")
+
+
+def test_old_snapshot_of_an_unchanged_dataset_is_not_republished(fuseki):
+    swaps = []
+    cache = cache_for(fuseki, max_age=0)
+    cache.subscribe(lambda old, new, added, removed: swaps.append(new.revision))
+    snapshot = cache.snapshot
+
+    assert cache.refresh() is False
+    assert cache.graph is snapshot.graph
+    assert cache.snapshot.loaded_at >= snapshot.loaded_at
+    assert swaps == [1]
+
+
+def test_etag_revalidation_uses_conditional_get(fuseki):
+    fuseki.etag = '"v1"'
+    cache = cache_for(fuseki)
+    cache.snapshot
+
+    assert cache.refresh() is False
+
+    fuseki.graph.set((ONTO.crash2, ONTO.weather, Literal("Wind")))
+    fuseki.etag = '"v2"'
+    assert cache.refresh() is True
+    assert cache.snapshot.etag == '"v2"'
+    assert not any(path.endswith("/query") for _, path in fuseki.requests)
+
+
+def test_subscribers_see_the_new_snapshot_before_it_is_published(fuseki):
+    cache = cache_for(fuseki)
+    seen = []
+    cache.subscribe(lambda old, new, added, removed: seen.append((old, new, cache._snapshot)))
+    first = cache.snapshot
+    fuseki.graph.add((ONTO.crash1, ONTO.weather, Literal("Clear")))
+    cache.refresh()
+
+    assert seen[0] == (None, first, None)
+    old, new, published = seen[1]
+    assert old is first and new is cache.snapshot and published is first
+
+
+def test_subscribers_share_one_delta_per_swap(fuseki, monkeypatch):
+    deltas = []
+    diff = graph_cache.graph_delta
+    monkeypatch.setattr(graph_cache, "graph_delta", lambda old, new: deltas.append(1) or diff(old, new))
+    cache = cache_for(fuseki)
+    seen = []
+    for _ in range(3):
+        cache.subscribe(lambda old, new, added, removed: seen.append((added, removed)))
+    cache.snapshot
+    fuseki.graph.set((ONTO.crash2, ONTO.weather, Literal("Wind")))
+    fuseki.graph.add((ONTO.crash1, ONTO.weather, Literal("Clear")))
+    cache.refresh()
+
+    assert seen[:3] == [(None, None)] * 3
+    assert seen[3:] == [(
+        {(ONTO.crash2, ONTO.weather, Literal("Wind")), (ONTO.crash1, ONTO.weather, Literal("Clear"))},
+        {(ONTO.crash2, ONTO.weather, Literal("Clear"))},
+    )] * 3
+    assert len(deltas) == 1
@@ -0,0 +1,137 @@
+import re
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+from backends import AutoBackend, RemoteBackend
+from instrumentation import STAGES, Metrics, add, instrument, percentile, stage
+from test_backends import route_urls
+
+SERVER_TIMING = re.compile(r"\w+;dur=\d+\.\d{3}(, \w+;dur=\d+\.\d{3})*")
+
+
+def server_timing(response):
+    """The ``Server-Timing`` header as ``{name: milliseconds}``."""
+    timings = {}
+    for metric in response.headers["Server-Timing"].split(", "):
+        name, duration = metric.split(";dur=")
+        timings[name] = float(duration)
+    return timings
+
+
+@pytest.fixture(params=["local", "remote", "auto"])
+def backend(request, app_module, monkeypatch):
+    local = app_module.backend
+    if request.param != "local":
+        remote = RemoteBackend(app_module.queries, app_module.QUERY_URL)
+        monkeypatch.setattr(
+            app_module, "backend", remote if request.param == "remote" else AutoBackend(local, remote, explore_every=2)
+        )
+    # Cached responses skip the work whose timing is under test
+    monkeypatch.setattr(app_module.response_cache, "revision", lambda: None)
+    app_module.metrics.reset()
+    yield request.param
+    app_module.metrics.reset()
+
+
+def test_stages_are_never_negative_and_add_up_to_at_most_the_total(app_module, client, backend):
+    for url in route_urls(app_module.app):
+        response = client.get(url)
+        response.get_data()
+        response.close()
+        timings = server_timing(response)
+
+        assert list(timings) == [*STAGES, "total"], url
+        assert all(duration >= 0 for duration in timings.values()), (url, timings)
+        assert sum(timings[name] for name in STAGES) <= timings["total"], (url, timings)
+
+    for endpoint, stats in app_module.metrics.snapshot()["endpoints"].items():
+        assert all(ms >= 0 for ms in stats["mean_stage_ms"].values()), (endpoint, stats)
+        assert sum(stats["mean_stage_ms"].values()) <= stats["mean_ms"], (endpoint, stats)
+
+
+@pytest.fixture
+def timed_app():
+    app = Flask(__name__)
+    metrics = Metrics(samples=3)
+    instrument(app, metrics)
+
+    @app.route("/nested")
+    def nested():
+        with stage("rows"):
+            time.sleep(0.01)
+            with stage("query"):
+                time.sleep(0.03)
+            # Measured by the caller while "rows" is open, like a query's rows
+            start = time.perf_counter()
+            time.sleep(0.002)
+            add("query", time.perf_counter() - start)
+        return jsonify([])
+
+    return app.test_client(), metrics
+
+
+def test_inner_stages_are_taken_out_of_the_enclosing_one(timed_app):
+    client, metrics = timed_app
+
+    timings = server_timing(client.get("/nested"))
+
+    assert 0.01 * 1000 <= timings["rows"] < timings["query"]
+    assert timings["query"] >= 0.032 * 1000
+    assert timings["fetch"] == 0
+    assert sum(timings[name] for name in STAGES) <= timings["total"]
+
+
+def test_server_timing_lists_every_stage_then_the_total(timed_app):
+    client, _ = timed_app
+
+    header = client.get("/nested").headers["Server-Timing"]
+
+    assert SERVER_TIMING.fullmatch(header), header
+    assert [metric.split(";")[0] for metric in header.split(", ")] == [*STAGES, "total"]
+
+
+def test_stages_do_nothing_outside_a_request():
+    with stage("rows"):
+        add("query", 1.0)
+
+
+def test_metrics_keep_the_last_samples_and_mean_stage_times():
+    metrics = Metrics(samples=3)
+    for seconds in (0.5, 0.001, 0.002, 0.003):
+        metrics.record("route", seconds, {"query": seconds / 2, "rows": 0.0})
+
+    stats = metrics.snapshot()["endpoints"]["route"]
+
+    assert stats["requests"] == 4
+    assert (stats["p50_ms"], stats["max_ms"]) == pytest.approx((2, 3))
+    assert stats["mean_ms"] == pytest.approx(2)
+    # Stage totals cover every request, not just the sampled ones
+    assert stats["mean_stage_ms"]["query"] == pytest.approx(506 / 2 / 4)
+    assert set(stats["mean_stage_ms"]) == set(STAGES)
+
+
+@pytest.mark.parametrize("p, expected", [(1, 1), (50, 50), (90, 90), (99, 99), (100, 100)])
+def test_percentile_is_nearest_rank(p, expected):
+    assert percentile(list(range(1, 101)), p) == expected
+
+
+def test_percentile_of_few_samples_rounds_up():
+    assert percentile([1, 2, 3], 50) == 2
+    assert percentile([1, 2, 3], 90) == 3
+    assert percentile([], 50) is None
+
+
+def test_metrics_route_reports_the_requests_made(app_module, client, backend):
+    for _ in range(3):
+        # Closing the response is what records it
+        client.get("/countAllCrashedByPhase").close()
+
+    report = client.get("/metrics").get_json()
+
+    stats = report["endpoints"]["countAllCrashedByPhase"]
+    assert stats["requests"] == 3
+    assert 0 < stats["p50_ms"] <= stats["p90_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert set(stats["mean_stage_ms"]) == set(STAGES)
+    assert stats["mean_stage_ms"]["query"] > 0
@@ -0,0 +1,98 @@
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+from backends import RemoteBackend
+
+PAGED = [
+    "/getAllData",
+    "/filterDataByPhase/landing",
+    "/filterDataByDate?date=2023-01-10",
+    "/filterAllDataWithWeatherCondition/fog",
+]
+
+
+@pytest.fixture(params=["local", "remote"])
+def paged_client(request, app_module, client, monkeypatch):
+    if request.param == "remote":
+        monkeypatch.setattr(app_module, "backend", RemoteBackend(app_module.queries, app_module.QUERY_URL))
+    return client
+
+
+def with_args(url, **args):
+    separator = "&" if "?" in url else "?"
+    return url + separator + urlencode(args)
+
+
+def pages(client, url, limit):
+    after = None
+    while True:
+        args = {"limit": limit}
+        if after is not None:
+            args["after"] = after
+        page = client.get(with_args(url, **args)).get_json()
+        if not page:
+            return
+        yield page
+        after = page[-1]["drone"]
+
+
+@pytest.mark.parametrize("url", PAGED)
+@pytest.mark.parametrize("limit", [1, 2, 100])
+def test_pages_add_up_to_the_full_result(paged_client, url, limit):
+    full = paged_client.get(url).get_json()
+
+    assert [row for page in pages(paged_client, url, limit) for row in page] == full
+    assert full
+
+
+@pytest.mark.parametrize("url", PAGED)
+def test_a_page_never_splits_a_drone(paged_client, url):
+    seen = set()
+    for page in pages(paged_client, url, 1):
+        drones = {row["drone"] for row in page}
+        assert len(drones) == 1
+        assert not drones & seen
+        seen |= drones
+
+
+@pytest.mark.parametrize("args", [
+    {"after": "a>b"},
+    {"after": "http://ubt/crashedDrones#drone 1"},
+    {"limit": 0},
+    {"limit": -1},
+    {"limit": "ten"},
+])
+def test_bad_paging_arguments_are_rejected(paged_client, args):
+    for url in PAGED:
+        response = paged_client.get(with_args(url, **args))
+        assert response.status_code == 400, (url, args)
+
+
+def test_drone_rows_on_one_page_go_past_the_limit(paged_client):
+    page = paged_client.get("/getAllData?limit=1").get_json()
+
+    # crash2, and crash1 once for each of its two weathers
+    assert [row["drone"].rsplit("#", 1)[1] for row in page] == ["drone1"] * 3
+
+
+@pytest.mark.parametrize("url", PAGED)
+def test_ndjson_carries_the_same_rows_as_the_array(paged_client, url):
+    # Each streamed body is read before the next request starts
+    array = paged_client.get(url)
+    assert array.mimetype == "application/json"
+    rows = array.get_json()
+    ndjson = paged_client.get(with_args(url, format="ndjson"))
+    assert ndjson.mimetype == "application/x-ndjson"
+    lines = ndjson.get_data(as_text=True)
+    accepted = paged_client.get(url, headers={"Accept": "application/x-ndjson"})
+    assert accepted.mimetype == "application/x-ndjson"
+
+    assert [json.loads(line) for line in lines.splitlines()] == rows
+    assert accepted.get_data(as_text=True) == lines
+
+
+def test_empty_result_streams_as_an_empty_array(paged_client):
+    assert paged_client.get("/filterDataByPhase/nowhere").get_data(as_text=True) == "[]"
+    assert paged_client.get("/filterDataByPhase/nowhere?format=ndjson").get_data() == b""
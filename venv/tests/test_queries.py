@@ -0,0 +1,78 @@
+import pytest
+from rdflib import Literal
+
+from queries import ONTO, QueryRegistry
+from conftest import crash_graph
+
+CRASHES_BY = """
+    SELECT ?drone ?crashEvent ?location WHERE {{
+      ?drone onto:involvedInCrash ?crashEvent .
+      ?crashEvent onto:location ?location .
+      ?crashEvent onto:{predicate} {value} .
+    }}
+"""
+
+
+def rows(result):
+    return sorted(tuple(row) for row in result)
+
+
+def test_compile_time_is_recorded_once_and_kept_apart_from_evaluation():
+    registry = QueryRegistry()
+    registry.register("byWeather", CRASHES_BY.format(predicate="weather", value="?weather"))
+    compile_ms = registry.stats()["byWeather"]["compile_ms"]
+
+    assert compile_ms > 0
+    assert registry.stats()["byWeather"] == {
+        "compile_ms": compile_ms, "calls": 0, "eval_ms": 0.0, "mean_eval_ms": None,
+    }
+
+    graph = crash_graph()
+    for weather in ("Fog", "Wind"):
+        rows(registry.query("byWeather", graph, weather=weather))
+    stats = registry.stats()["byWeather"]
+
+    assert stats["compile_ms"] == compile_ms
+    assert stats["calls"] == 2
+    assert stats["eval_ms"] > 0
+    assert stats["mean_eval_ms"] == pytest.approx(stats["eval_ms"] / 2)
+
+
+def test_results_are_only_recorded_once_read():
+    registry = QueryRegistry()
+    registry.register("byWeather", CRASHES_BY.format(predicate="weather", value="?weather"))
+
+    result = registry.query("byWeather", crash_graph(), weather="Fog")
+    assert registry.stats()["byWeather"]["calls"] == 0
+    rows(result)
+    assert registry.stats()["byWeather"]["calls"] == 1
+
+
+@pytest.mark.parametrize("predicate, value", [
+    ("weather", "Fog"),
+    ("weather", "Heavy Rain/Snow"),
+    ("phase", "Landing"),
+    ("location", "Kyiv, Ukraine"),
+    ("weather", "nowhere"),
+    ("date", Literal("2023-01-10")),
+])
+def test_bound_parameters_give_the_rows_of_the_inlined_literal(predicate, value):
+    registry = QueryRegistry()
+    registry.register("bound", CRASHES_BY.format(predicate=predicate, value=f"?{predicate}"))
+    registry.register("inlined", CRASHES_BY.format(predicate=predicate, value=Literal(value).n3()))
+    graph = crash_graph()
+
+    bound = rows(registry.query("bound", graph, **{predicate: value}))
+
+    assert bound == rows(registry.query("inlined", graph))
+    assert bound == rows(graph.query(registry.remote_text("bound", **{predicate: value})))
+    assert bool(bound) == (value != "nowhere")
+
+
+def test_bound_iris_match_like_inlined_ones():
+    registry = QueryRegistry()
+    registry.register("crashesOf", "SELECT ?crashEvent WHERE { ?drone onto:involvedInCrash ?crashEvent }")
+    registry.register("crashesOfDrone1", "SELECT ?crashEvent WHERE { onto:drone1 onto:involvedInCrash ?crashEvent }")
+    graph = crash_graph()
+
+    assert rows(registry.query("crashesOf", graph, drone=ONTO.drone1)) == rows(registry.query("crashesOfDrone1", graph))
@@ -0,0 +1,195 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, Response, jsonify, request
+
+from result_cache import Entry, ResultCache
+
+
+def entry(body, revision=1):
+    return Entry(body, 200, "application/json", revision, None)
+
+
+def swap(cache, revision):
+    cache.on_swap(None, SimpleNamespace(revision=revision), None, None)
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache(lambda: 1)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return entry(b"[]")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("k", 1, compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    # Let every thread reach the cache before the first computation finishes
+    while cache.stats()["misses"] + cache.stats()["waits"] < len(threads):
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [result.body for result in results] == [b"[]"] * len(threads)
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["waits"] == len(threads) - 1
+
+
+def test_waiters_compute_their_own_when_the_first_request_fails():
+    cache = ResultCache(lambda: 1)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    def leader():
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute("k", 1, failing)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+    waiter = []
+    follower = threading.Thread(target=lambda: waiter.append(cache.get_or_compute("k", 1, lambda: entry(b"1"))))
+    follower.start()
+    while cache.stats()["waits"] < 1:
+        pass
+    release.set()
+    thread.join()
+    follower.join()
+
+    assert waiter[0].body == b"1"
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = ResultCache(lambda: 1, max_entries=2)
+    cache.get_or_compute("a", 1, lambda: entry(b"a"))
+    cache.get_or_compute("b", 1, lambda: entry(b"b"))
+    cache.get_or_compute("a", 1, lambda: entry(b"stale"))
+    cache.get_or_compute("c", 1, lambda: entry(b"c"))
+
+    assert cache.get_or_compute("a", 1, lambda: entry(b"recomputed")).body == b"a"
+    assert cache.get_or_compute("b", 1, lambda: entry(b"recomputed")).body == b"recomputed"
+    assert cache.stats()["evictions"] == 2
+
+
+def test_bodies_are_kept_within_the_byte_bound():
+    cache = ResultCache(lambda: 1, max_bytes=10)
+    cache.get_or_compute("a", 1, lambda: entry(b"123456"))
+    cache.get_or_compute("b", 1, lambda: entry(b"123456"))
+    cache.get_or_compute("huge", 1, lambda: entry(b"x" * 11))
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (1, 6, 1)
+    assert stats["uncacheable"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResultCache(lambda: 1, ttl=0)
+    cache.get_or_compute("a", 1, lambda: entry(b"old"))
+
+    assert cache.get_or_compute("a", 1, lambda: entry(b"new")).body == b"new"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_swap_drops_the_entries_of_older_revisions():
+    cache = ResultCache(lambda: 1)
+    swap(cache, 1)
+    cache.get_or_compute(("a", 1), 1, lambda: entry(b"a"))
+
+    swap(cache, 2)
+    # Computed against revision 1 but finished after the swap
+    cache.get_or_compute(("b", 1), 1, lambda: entry(b"b"))
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["invalidations"], stats["uncacheable"]) == (0, 1, 1)
+
+
+@pytest.fixture
+def cached_app():
+    app = Flask(__name__)
+    state = SimpleNamespace(revision=1, calls=[])
+    cache = ResultCache(lambda: state.revision)
+
+    @app.route("/weather/<weather_condition>")
+    @cache.cached(weather_condition=str.capitalize)
+    def weather(weather_condition):
+        state.calls.append(weather_condition)
+        return jsonify([weather_condition.capitalize()])
+
+    @app.route("/crashes")
+    @cache.cached(args=["limit"])
+    def crashes():
+        limit = request.args.get("limit", type=int)
+        state.calls.append(limit)
+        return jsonify(list(range(10))[:limit])
+
+    @app.route("/failing")
+    @cache.cached()
+    def failing():
+        state.calls.append("failing")
+        return jsonify({"error": "backend down"}), 502
+
+    @app.route("/streamed")
+    @cache.cached()
+    def streamed():
+        state.calls.append("streamed")
+        return Response(iter(["[", "]"]), mimetype="application/json")
+
+    return app.test_client(), cache, state
+
+
+def test_equivalent_parameters_share_an_entry(cached_app):
+    client, cache, state = cached_app
+
+    assert client.get("/weather/fog").get_json() == ["Fog"]
+    assert client.get("/weather/Fog").get_json() == ["Fog"]
+    # The view reads no query arguments, so they do not make another entry
+    assert client.get("/weather/fog?x=1").get_json() == ["Fog"]
+    assert state.calls == ["fog"]
+
+
+def test_only_the_query_arguments_a_view_names_are_keyed_on(cached_app):
+    client, cache, state = cached_app
+
+    assert client.get("/crashes?limit=2").get_json() == [0, 1]
+    assert client.get("/crashes?limit=2&_=123").get_json() == [0, 1]
+    assert client.get("/crashes?limit=3").get_json() == [0, 1, 2]
+    assert client.get("/crashes").get_json() == list(range(10))
+    assert state.calls == [2, 3, None]
+
+
+def test_error_and_streamed_responses_are_not_cached(cached_app):
+    client, cache, state = cached_app
+
+    for _ in range(2):
+        assert client.get("/failing").status_code == 502
+        assert client.get("/streamed").get_data() == b"[]"
+
+    assert state.calls == ["failing", "streamed"] * 2
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["uncacheable"] == 4
+
+
+def test_requests_bypass_the_cache_without_a_revision(cached_app):
+    client, cache, state = cached_app
+    state.revision = None
+
+    client.get("/weather/fog")
+    client.get("/weather/fog")
+
+    assert state.calls == ["fog", "fog"]
+    assert cache.stats()["bypassed"] == 2
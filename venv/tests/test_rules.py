@@ -0,0 +1,132 @@
+import pytest
+from rdflib import Graph, Literal, RDF, URIRef, Variable
+
+from graph_cache import Snapshot, graph_delta
+from queries import ONTO
+from rules import RuleEngine, parse_rule
+from conftest import crash_graph
+
+RULES = [
+    parse_rule('Drone(?d) ^ CrashEvent(?e) ^ involvedInCrash(?d, ?e) ^ weather(?e, "Fog") -> hasRisk(?d, "High")'),
+    # Chains over its own output, so materializing takes several rounds
+    parse_rule("sameOperator(?a, ?b) ^ sameOperator(?b, ?c) -> sameOperator(?a, ?c)"),
+    parse_rule('hasRisk(?d, "High") ^ sameOperator(?d, ?o) -> hasRisk(?o, "High")'),
+]
+
+
+def snapshot(graph, revision):
+    return Snapshot(graph, revision, None, None, None, None, 0)
+
+
+def engine_for(graph, revision=1):
+    engine = RuleEngine(RULES)
+    engine.materialize(graph, revision)
+    return engine
+
+
+def with_chain(graph, *drones):
+    for a, b in zip(drones, drones[1:]):
+        graph.add((ONTO[a], ONTO.sameOperator, ONTO[b]))
+    return graph
+
+
+def test_parse_rule_reads_every_kind_of_argument():
+    rule = parse_rule('Drone(?d) ^ weather(?d, "Heavy Rain") ^ model(?d, <http://x/m>) -> hasRisk(?d, High)')
+
+    d = Variable("d")
+    assert rule.body == [
+        (d, RDF.type, ONTO.Drone),
+        (d, ONTO.weather, Literal("Heavy Rain")),
+        (d, ONTO.model, URIRef("http://x/m")),
+    ]
+    assert rule.head == [(d, ONTO.hasRisk, ONTO.High)]
+
+
+@pytest.mark.parametrize("text", [
+    "weather(?d, Heavy Rain) -> hasRisk(?d, High)",
+    "weather(??d, Fog) -> hasRisk(?d, High)",
+    "weather(?d, Fog,) -> hasRisk(?d, High)",
+    "weather() -> hasRisk(?d, High)",
+    "weather(?d ?e) -> hasRisk(?d, High)",
+    'weather(?d, "Fog) -> hasRisk(?d, High)',
+    "weather(?d, Fog, ?e) -> hasRisk(?d, High)",
+    "weather(?d, Fog) -> hasRisk(?e, High)",
+    "weather(?d, Fog)",
+])
+def test_parse_rule_rejects_malformed_rules(text):
+    with pytest.raises(ValueError):
+        parse_rule(text)
+
+
+def test_materialize_follows_chains_of_derived_facts():
+    graph = with_chain(crash_graph(), "drone1", "drone4", "drone5")
+    engine = engine_for(graph)
+
+    assert (ONTO.drone1, ONTO.sameOperator, ONTO.drone5) in engine.inferred
+    assert {d for d, _ in engine.inferred.subject_objects(ONTO.hasRisk)} == {
+        ONTO.drone1, ONTO.drone2, ONTO.drone3, ONTO.drone4, ONTO.drone5,
+    }
+    # Derived triples stay out of the source graph
+    assert not set(graph.triples((None, ONTO.hasRisk, None)))
+
+
+def test_added_triples_derive_what_a_rematerialization_would():
+    old = with_chain(crash_graph(), "drone4", "drone5")
+    engine = engine_for(old)
+    new = old + Graph()
+    added = [
+        (ONTO.drone6, ONTO.sameOperator, ONTO.drone4),
+        (ONTO.drone6, ONTO.involvedInCrash, ONTO.crash10),
+        (ONTO.crash10, RDF.type, ONTO.CrashEvent),
+        (ONTO.crash10, ONTO.weather, Literal("Fog")),
+    ]
+    for triple in added:
+        new.add(triple)
+
+    engine.add(new, added, 2)
+
+    assert engine.revision == 2
+    assert set(engine.inferred) == set(engine_for(new).inferred)
+    assert (ONTO.drone5, ONTO.hasRisk, Literal("High")) in engine.inferred
+
+
+def test_added_triples_extend_the_overlay_without_copying_it():
+    graph = with_chain(crash_graph(), "drone1", "drone2", "drone3", "drone4", "drone5", "drone6")
+    engine = engine_for(graph)
+    base = engine.inferred
+    published = []
+
+    for i in range(20):
+        added = [
+            (ONTO.drone4, ONTO.sameOperator, ONTO[f"op{i}"]),
+            (ONTO[f"op{i}"], RDF.type, ONTO.Drone),
+        ]
+        for triple in added:
+            graph.add(triple)
+        engine.add(graph, added, i + 2)
+        if i == 0:
+            # Far smaller than what was inferred already, so it is layered on top
+            assert engine._layers[0] is base and len(engine._layers) == 2
+        published.append((engine.inferred, set(engine.inferred)))
+
+    # Earlier overlays are never changed, and merging keeps the layers few
+    assert all(set(overlay) == triples for overlay, triples in published)
+    assert len(engine._layers) <= 6
+    assert set(engine.inferred) == set(engine_for(graph).inferred)
+    assert (ONTO.op19, ONTO.hasRisk, Literal("High")) in engine.inferred
+
+
+def test_swap_derives_from_additions_and_rematerializes_on_removals():
+    old = crash_graph()
+    engine = engine_for(old)
+
+    added = with_chain(old + Graph(), "drone1", "drone5")
+    engine.on_swap(snapshot(old, 1), snapshot(added, 2), *graph_delta(old, added))
+    assert (ONTO.drone5, ONTO.hasRisk, Literal("High")) in engine.inferred
+
+    removed = added + Graph()
+    removed.remove((ONTO.crash1, ONTO.weather, Literal("Fog")))
+    engine.on_swap(snapshot(added, 2), snapshot(removed, 3), *graph_delta(added, removed))
+    assert engine.revision == 3
+    assert (ONTO.drone1, ONTO.hasRisk, Literal("High")) not in engine.inferred
+    assert set(engine.inferred) == set(engine_for(removed).inferred)
@@ -0,0 +1,193 @@
+import pickle
+
+import pytest
+from rdflib import Literal
+
+from aggregates import CountIndex, View
+from columnar import COLUMNS, CrashTable
+from graph_cache import StoreCache, graph_delta
+from ingest import crash_iri, drone_iri, ingest, main, unnamed_drone_iri
+from queries import ONTO
+from rules import RuleEngine, parse_rule
+from triple_store import load_derived, save_derived
+
+VIEWS = {
+    "byModel": View(group_by=["model"]),
+    "byPhase": View(group_by=["phase"], where=["weather"]),
+    "eventsByLocation": View(group_by=["location"], facts="event"),
+}
+RULES = [parse_rule('involvedInCrash(?d, ?e) ^ weather(?e, "Fog") -> hasRisk(?d, "High")')]
+
+ROWS = [
+    {"drone": "drone1", "model": "Reaper", "operator": "Operator A",
+     "date": "2023-01-10", "location": "Kyiv, Ukraine", "phase": "Landing", "weather": "Fog"},
+    {"drone": "drone1", "model": "Reaper", "operator": "Operator A",
+     "date": "2023-02-11", "location": "Kyiv, Ukraine", "phase": "Cruise", "weather": "Clear"},
+    {"model": "Orion", "location": "Gaza, Palestine", "phase": "Takeoff", "weather": "Fog"},
+    {"model": "Heron", "operator": "Operator C", "location": "Komotini, Greece"},
+]
+MORE_ROWS = [
+    {"drone": "drone1", "model": "Reaper", "operator": "Operator A",
+     "location": "Gaza, Palestine", "phase": "Landing", "weather": "Snow"},
+    {"model": "Orion", "location": "Kyiv, Ukraine", "phase": "Landing", "weather": "Fog"},
+]
+
+
+def states():
+    return {"counts": CountIndex(VIEWS), "rules": RuleEngine(RULES), "table": CrashTable()}
+
+
+def cache_for(path, states):
+    cache = StoreCache(str(path), interval=0)
+    for name, state in states.items():
+        cache.subscribe(state.on_swap)
+        cache.persist(name, state)
+    return cache
+
+
+def contents(states):
+    counts = states["counts"]
+    return (
+        {name: counts.counts(name, **where) for name, where in [
+            ("byModel", {}), ("byPhase", {"weather": "Fog"}), ("eventsByLocation", {}),
+        ]},
+        set(states["rules"].inferred),
+        list(states["table"].select(list(COLUMNS))),
+    )
+
+
+def test_generated_iris_continue_across_appends_and_never_collide_with_named_drones(tmp_path):
+    path = str(tmp_path / "crashes.db")
+    ingest(path, ROWS)
+    ingest(path, MORE_ROWS)
+    graph = StoreCache(path, interval=0).graph
+
+    crashes = set(graph.objects(None, ONTO.involvedInCrash))
+    assert crashes == {crash_iri(number) for number in range(1, 7)}
+    assert set(graph.subjects(ONTO.involvedInCrash, None)) == {
+        drone_iri("drone1"), unnamed_drone_iri(1), unnamed_drone_iri(2), unnamed_drone_iri(3),
+    }
+    assert len(set(graph.objects(drone_iri("drone1"), ONTO.involvedInCrash))) == 3
+    assert drone_iri("drone-1") != unnamed_drone_iri(1)
+    assert drone_iri("crash 1") not in crashes
+
+
+def test_drones_named_without_letters_or_digits_get_numbered_iris(tmp_path):
+    path = str(tmp_path / "crashes.db")
+    ingest(path, [{"drone": "???", "model": "Orion"}, {"drone": " - ", "model": "Heron"}])
+    graph = StoreCache(path, interval=0).graph
+
+    assert drone_iri("???") is None
+    assert set(graph.subjects(ONTO.involvedInCrash, None)) == {unnamed_drone_iri(1), unnamed_drone_iri(2)}
+
+
+@pytest.mark.parametrize("size", ["0", "-5"])
+def test_ingest_rejects_batch_sizes_below_one(tmp_path, size, capsys):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / "crashes.db"), "-", "--batch-size", size])
+    assert "--batch-size" in capsys.readouterr().err
+
+
+def test_store_cache_on_a_missing_store_fails_at_once(tmp_path):
+    with pytest.raises(FileNotFoundError, match="ingest.py"):
+        StoreCache(str(tmp_path / "missing.db"))
+
+
+def test_restart_resumes_from_saved_state_without_a_scan(tmp_path, monkeypatch):
+    path = tmp_path / "crashes.db"
+    _, revision = ingest(str(path), ROWS)
+    first = states()
+    cache = cache_for(path, first)
+    cache.refresh()
+    cache.save()
+    assert load_derived(str(path), "counts")[0] == revision
+
+    monkeypatch.setattr(CountIndex, "build", None)
+    monkeypatch.setattr(RuleEngine, "materialize", None)
+    monkeypatch.setattr(CrashTable, "load", None)
+    restarted = states()
+    cache_for(path, restarted).refresh()
+
+    assert all(state.revision == revision for state in restarted.values())
+    assert contents(restarted) == contents(first)
+
+
+def test_restart_catches_up_with_what_was_appended_since_the_save(tmp_path):
+    path = tmp_path / "crashes.db"
+    ingest(str(path), ROWS)
+    saved = states()
+    cache = cache_for(path, saved)
+    cache.refresh()
+    cache.save()
+    _, revision = ingest(str(path), MORE_ROWS)
+
+    restarted = states()
+    cache_for(path, restarted).refresh()
+    fresh = states()
+    cache = StoreCache(str(path), interval=0)
+    for state in fresh.values():
+        cache.subscribe(state.on_swap)
+    cache.refresh()
+
+    assert all(state.revision == revision for state in restarted.values())
+    assert contents(restarted) == contents(fresh)
+    assert (drone_iri("drone1"), ONTO.hasRisk, Literal("High")) in restarted["rules"].inferred
+
+
+class Exploit:
+    ran = False
+
+    def __reduce__(self):
+        return setattr, (Exploit, "ran", True)
+
+
+def test_saved_state_is_never_unpickled(tmp_path):
+    path = tmp_path / "crashes.db"
+    _, revision = ingest(str(path), ROWS)
+    for name in states():
+        save_derived(str(path), name, revision, pickle.dumps(Exploit()))
+    fresh = states()
+    cache = StoreCache(str(path), interval=0)
+    for state in fresh.values():
+        cache.subscribe(state.on_swap)
+    cache.refresh()
+
+    restarted = states()
+    cache_for(path, restarted).refresh()
+
+    assert not Exploit.ran
+    assert contents(restarted) == contents(fresh)
+
+
+def test_state_saved_for_other_views_is_built_again(tmp_path):
+    path = tmp_path / "crashes.db"
+    ingest(str(path), ROWS)
+    cache = cache_for(path, {"counts": CountIndex({"byModel": View(group_by=["model"])})})
+    cache.refresh()
+    cache.save()
+
+    restarted = states()
+    cache_for(path, restarted).refresh()
+
+    assert restarted["counts"].counts("byPhase", weather="Fog") == {
+        (Literal("Landing"),): 1, (Literal("Takeoff"),): 1,
+    }
+
+
+def test_table_update_matches_a_reload(tmp_path):
+    path = str(tmp_path / "crashes.db")
+    ingest(path, ROWS)
+    cache = StoreCache(path, interval=0)
+    old = cache.snapshot
+    ingest(path, MORE_ROWS)
+    cache.refresh()
+    new = cache.snapshot
+
+    table = CrashTable()
+    table.load(old.graph, old.revision)
+    table.on_swap(old, new, *graph_delta(old.graph, new.graph))
+    reloaded = CrashTable()
+    reloaded.load(new.graph, new.revision)
+
+    assert list(table.select(list(COLUMNS))) == list(reloaded.select(list(COLUMNS)))
+    assert list(table.select(["drone"], weather="Snow")) == [(drone_iri("drone1"),)]
@@ -0,0 +1,345 @@
+import json
+import sqlite3
+import struct
+import sys
+import threading
+from array import array
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.store import Store
+
+# Term kinds in the term dictionary
+IRI, BLANK, LITERAL = 0, 1, 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    kind INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    datatype TEXT NOT NULL DEFAULT '',
+    lang TEXT NOT NULL DEFAULT '',
+    UNIQUE (kind, value, datatype, lang)
+);
+CREATE TABLE IF NOT EXISTS triples (
+    s INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    o INTEGER NOT NULL,
+    rev INTEGER NOT NULL,
+    PRIMARY KEY (s, p, o)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, s);
+CREATE INDEX IF NOT EXISTS triples_osp ON triples (o, s, p);
+CREATE INDEX IF NOT EXISTS triples_rev ON triples (rev);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS derived (
+    name TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    state BLOB NOT NULL
+);
+"""
+
+# Bytes of the database file SQLite may map into memory for reads
+MMAP_SIZE = 1 << 30
+
+
+def encode_term(term):
+    """Return the ``(kind, value, datatype, lang)`` row for an rdflib term."""
+    if isinstance(term, Literal):
+        return LITERAL, str(term), str(term.datatype or ""), term.language or ""
+    if isinstance(term, BNode):
+        return BLANK, str(term), "", ""
+    return IRI, str(term), "", ""
+
+
+def decode_term(kind, value, datatype, lang):
+    if kind == LITERAL:
+        return Literal(value, lang=lang or None, datatype=datatype or None)
+    if kind == BLANK:
+        return BNode(value)
+    return URIRef(value)
+
+
+def connect(path, readonly=False):
+    if readonly:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+    connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    return connection
+
+
+def store_revision(path):
+    """Return the revision of the store at ``path``; 0 for an empty store."""
+    connection = connect(path, readonly=True)
+    try:
+        return _meta(connection, "revision")
+    finally:
+        connection.close()
+
+
+class TermIds(dict):
+    """Numbers terms as they are first looked up; ``rows`` is the table ``decode_terms`` reads."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+
+    def __missing__(self, term):
+        self[term] = id = len(self.rows)
+        self.rows.append(encode_term(term))
+        return id
+
+
+def decode_terms(rows):
+    return [decode_term(*row) for row in rows]
+
+
+def pack_state(header, arrays=()):
+    """Encode derived state as bytes: a JSON ``header``, then the raw contents of ``arrays``.
+
+    Terms go in the header as ``encode_term`` rows, numbers and codes in
+    ``array``s. Nothing in the result is executed when it is read back,
+    unlike a pickle, so a store file can be shared without trusting it.
+    """
+    header = dict(header, arrays=[[a.typecode, len(a)] for a in arrays], byteorder=sys.byteorder)
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    return b"".join([struct.pack("<Q", len(encoded)), encoded, *(a.tobytes() for a in arrays)])
+
+
+def unpack_state(data):
+    """Return the ``(header, arrays)`` that ``pack_state`` encoded, or None for other data."""
+    try:
+        (size,) = struct.unpack_from("<Q", data)
+        header = json.loads(bytes(data[8:8 + size]))
+        position = 8 + size
+        arrays = []
+        for typecode, length in header.pop("arrays"):
+            values = array(typecode)
+            end = position + values.itemsize * length
+            values.frombytes(data[position:end])
+            if len(values) != length:
+                return None
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+            arrays.append(values)
+            position = end
+    except (struct.error, ValueError, TypeError, KeyError, AttributeError):
+        # Written by an earlier version, or damaged
+        return None
+    return header, arrays
+
+
+def load_derived(path, name):
+    """Return ``(revision, state)`` last saved under ``name`` in the store at ``path``, or None."""
+    connection = connect(path, readonly=True)
+    try:
+        return connection.execute("SELECT revision, state FROM derived WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        # A store written before derived state was kept has no table for it
+        return None
+    finally:
+        connection.close()
+
+
+def save_derived(path, name, revision, state):
+    """Save ``state``, bytes derived from the store at ``revision``, under ``name``."""
+    connection = connect(path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO derived (name, revision, state) VALUES (?, ?, ?)",
+                (name, revision, state),
+            )
+    finally:
+        connection.close()
+
+
+def _meta(connection, key, default=0):
+    row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return default if row is None else row[0]
+
+
+class SQLiteStore(Store):
+    """Read-only rdflib store over an SQLite triple database at one revision.
+
+    Terms are kept once in a dictionary table and triples as three integer
+    ids, indexed as SPO, POS and OSP so every triple pattern is an index
+    range scan. Each triple records the revision that added it, and a store
+    opened at ``revision`` only sees triples up to it. Appends made by a
+    later ingestion therefore never show through an open store, which makes
+    it as immutable as a parsed snapshot while costing nothing to open: no
+    data is read until a pattern is looked up, and reads go through
+    SQLite's memory-mapped pages.
+
+    Each thread gets its own read-only connection. Decoded terms are cached
+    by id for the lifetime of the store.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, path, revision=None):
+        super().__init__()
+        self.path = path
+        self.revision = store_revision(path) if revision is None else revision
+        self._local = threading.local()
+        self._ids = {}
+        self._terms = {}
+        self._prefixes = {}
+        self._namespaces = {}
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path, readonly=True)
+        return connection
+
+    def _id(self, term):
+        term_id = self._ids.get(term)
+        if term_id is None:
+            row = self._connection().execute(
+                "SELECT id FROM terms WHERE kind = ? AND value = ? AND datatype = ? AND lang = ?",
+                encode_term(term),
+            ).fetchone()
+            if row is None:
+                return None
+            term_id = self._ids[term] = row[0]
+        return term_id
+
+    def triples(self, triple_pattern, context=None):
+        conditions = ["t.rev <= ?"]
+        parameters = [self.revision]
+        for column, term in zip("spo", triple_pattern):
+            if term is None:
+                continue
+            term_id = self._id(term)
+            if term_id is None:
+                return
+            conditions.append(f"t.{column} = ?")
+            parameters.append(term_id)
+        for triple in self._select(" AND ".join(conditions), parameters):
+            yield triple, iter((None,))
+
+    def added_since(self, revision):
+        """Return the set of triples added after ``revision``, up to this store's revision."""
+        return set(self._select("t.rev > ? AND t.rev <= ?", (revision, self.revision)))
+
+    def _select(self, where, parameters):
+        # Terms are joined in so that a scan never needs a query per new term
+        cursor = self._connection().execute(
+            "SELECT t.s, s.kind, s.value, s.datatype, s.lang,"
+            " t.p, p.kind, p.value, p.datatype, p.lang,"
+            " t.o, o.kind, o.value, o.datatype, o.lang"
+            " FROM triples t JOIN terms s ON s.id = t.s JOIN terms p ON p.id = t.p"
+            f" JOIN terms o ON o.id = t.o WHERE {where}",
+            parameters,
+        )
+        terms = self._terms
+        for row in cursor:
+            triple = []
+            for i in (0, 5, 10):
+                term = terms.get(row[i])
+                if term is None:
+                    term = terms[row[i]] = decode_term(*row[i + 1:i + 5])
+                    self._ids[term] = row[i]
+                triple.append(term)
+            yield tuple(triple)
+
+    def __len__(self, context=None):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM triples WHERE rev <= ?", (self.revision,)
+        ).fetchone()[0]
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add(self, triple, context, quoted=False):
+        raise TypeError("SQLiteStore is read-only; append with ingest.py")
+
+    def remove(self, triple, context=None):
+        raise TypeError("SQLiteStore is read-only; append with ingest.py")
+
+    def bind(self, prefix, namespace, override=True):
+        if not override and (prefix in self._namespaces or namespace in self._prefixes):
+            return
+        self._namespaces[prefix] = namespace
+        self._prefixes[namespace] = prefix
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        return iter(list(self._namespaces.items()))
+
+    def close(self, commit_pending_transaction=False):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class TripleWriter:
+    """Appends triples to the store at ``path`` as one new revision per batch.
+
+    Terms are looked up in, or added to, the term dictionary through a
+    bounded id cache, and each batch's triples go in with one
+    ``executemany``. A batch becomes visible to readers as a whole when its
+    transaction commits and the store's revision is bumped.
+    """
+
+    CACHE_SIZE = 100_000
+
+    def __init__(self, path):
+        self.connection = connect(path)
+        self.revision = _meta(self.connection, "revision")
+        self._ids = {}
+
+    def counter(self, key):
+        return _meta(self.connection, key)
+
+    def write(self, triples, **counters):
+        """Commit ``triples`` as the next revision, storing ``counters`` in the metadata."""
+        with self.connection:
+            revision = self.revision + 1
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO triples (s, p, o, rev) VALUES (?, ?, ?, ?)",
+                ((self._id(s), self._id(p), self._id(o), revision) for s, p, o in triples),
+            )
+            counters["revision"] = revision
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", counters.items()
+            )
+        self.revision = revision
+        return revision
+
+    def _id(self, term):
+        term_id = self._ids.get(term)
+        if term_id is not None:
+            return term_id
+        row = encode_term(term)
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO terms (kind, value, datatype, lang) VALUES (?, ?, ?, ?)", row
+        )
+        if cursor.rowcount:
+            term_id = cursor.lastrowid
+        else:
+            term_id = self.connection.execute(
+                "SELECT id FROM terms WHERE kind = ? AND value = ? AND datatype = ? AND lang = ?", row
+            ).fetchone()[0]
+        if len(self._ids) >= self.CACHE_SIZE:
+            self._ids.clear()
+        self._ids[term] = term_id
+        return term_id
+
+    def close(self):
+        self.connection.close()